@@ -0,0 +1,70 @@
+"""Measure bot cold start with python -X importtime.
+
+Usage: python benchmarks/import_time.py [runs] [--exe dist/CS2GoFish.exe]
+
+Runs `main.py --help` (every import, no console.log needed) runs times
+and reports the median import time, the heaviest top-level imports, and
+what pyautogui and tkinter would add if they were still imported at
+startup instead of on the first keypress / error dialog. --exe also times
+`--help` on a PyInstaller build of CS2GoFish.spec, which cannot report
+-X importtime, by wall clock.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_MODULES = "import tkinter, tkinter.messagebox\ntry:\n    import pyautogui\nexcept Exception:\n    pass  # no display\n"
+
+def import_times(args, env):
+    """Run python -X importtime args; return {top-level module: cumulative microseconds}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented under their importer
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+def median_run(args, env, runs):
+    samples = [import_times(args, env) for _ in range(runs)]
+    totals = [sum(modules.values()) for modules in samples]
+    middle = totals.index(sorted(totals)[len(totals) // 2])
+    return statistics.median(totals), samples[middle]
+
+def time_exe(path, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([path, "--help"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def main():
+    args = sys.argv[1:]
+    exe = None
+    if "--exe" in args:
+        exe = args.pop(args.index("--exe") + 1)
+        args.remove("--exe")
+    runs = int(args[0]) if args else 5
+    with tempfile.TemporaryDirectory() as base_path:
+        env = dict(os.environ, FISHBOT_BASE_PATH=base_path)  # keep fish.log out of the repo
+        total, modules = median_run(["main.py", "--help"], env, runs)
+        print(f"main.py --help: {total / 1000:.1f} ms of imports (median of {runs})")
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        loaded = [name for name in ("pyautogui", "tkinter") if name in modules]
+        print(f"GUI modules imported at startup: {', '.join(loaded) or 'none'}")
+        gui_total, _ = median_run(["-c", GUI_MODULES], env, runs)
+        print(f"pyautogui + tkinter when imported eagerly: {gui_total / 1000:.1f} ms more")
+        if exe:
+            print(f"{exe} --help: {time_exe(exe, env, runs) * 1000:.1f} ms wall clock (median of {runs})")
+
+if __name__ == "__main__":
+    main()
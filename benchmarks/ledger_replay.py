@@ -0,0 +1,72 @@
+"""Time startup replay of a large player stats ledger.
+
+Usage: python benchmarks/ledger_replay.py [records] [players]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.storage import LedgerBackend
+
+RARITIES = ["Common", "Uncommon", "Rare", "Very Rare", "Epic", "Legendary"]
+
+def build_files(directory, records, players):
+    names = [f"angler{i}" for i in range(players)]
+    snapshot = {
+        name: {
+            "balance": 0.0,
+            "total_casts": 0,
+            "total_fish_caught": 0,
+            "rarities": {rarity: 0 for rarity in RARITIES},
+            "equipped_rod": "Old Rod",
+            "equipped_bait": "Worm",
+            "original_username": name
+        }
+        for name in names
+    }
+    snapshot_path = os.path.join(directory, "player_stats.json")
+    ledger_path = os.path.join(directory, "player_stats.ledger")
+    with open(snapshot_path, "w") as file:
+        json.dump(snapshot, file)
+    rng = random.Random(1)
+    with open(ledger_path, "w") as file:
+        for _ in range(records):
+            name = rng.choice(names)
+            player = snapshot[name]
+            player["total_casts"] += 1
+            if rng.random() < 0.5:
+                player["total_fish_caught"] += 1
+                player["rarities"][rng.choice(RARITIES)] += 1
+                player["balance"] += rng.uniform(1, 500)
+                patch = {name: {field: player[field] for field in ("total_casts", "total_fish_caught", "rarities", "balance")}}
+                op = "catch"
+            else:
+                patch = {name: {"total_casts": player["total_casts"]}}
+                op = "cast"
+            file.write(json.dumps({"op": op, "p": patch}, separators=(",", ":")) + "\n")
+    return snapshot_path, ledger_path, snapshot
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path, ledger_path, expected = build_files(directory, records, players)
+        size_mb = os.path.getsize(ledger_path) / 1e6
+        backend = LedgerBackend(snapshot_path, ledger_path, os.path.join(directory, "global_stats.json"))
+        start = time.perf_counter()
+        loaded = backend.load()
+        elapsed = time.perf_counter() - start
+        assert loaded == expected, "replayed state does not match"
+        print(f"replayed {backend.records:,} records ({size_mb:.1f} MB) for {players:,} players in {elapsed:.2f}s "
+              f"({backend.records / elapsed:,.0f} records/s)")
+        start = time.perf_counter()
+        backend.compact(loaded)
+        print(f"compacted into snapshot in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Hammer one player from several processes sharing the same stats files and count lost updates.
+
+Usage: python benchmarks/lock_contention.py [processes] [updates] [--no-lock]
+
+Each process adds 1 to the same player's balance and total_casts, and to
+the global cast count, the way a catch does: change the live record, then
+commit it. Ledger compaction is set low so processes also compact under
+each other. With locking every update survives; --no-lock shows what
+unlocked writers lose. A deterministic check of the stale global stats
+rebase runs first.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.storage import LedgerBackend
+from modules.utils import PlayerStore
+
+PLAYER = "angler"
+COMPACT_EVERY = 200
+
+def open_store(directory, shared):
+    backend = LedgerBackend(
+        os.path.join(directory, "player_stats.json"),
+        os.path.join(directory, "player_stats.ledger"),
+        os.path.join(directory, "global_stats.json"),
+        shared=shared,
+    )
+    return PlayerStore(backend, flush_interval=0.05, flush_every=10, compact_every=COMPACT_EVERY)
+
+def writer(directory, updates, shared, start):
+    store = open_store(directory, shared)
+    start.wait()
+    for _ in range(updates):
+        record = store.get_or_create(PLAYER)
+        record["balance"] += 1.0
+        record["total_casts"] += 1
+        store.global_stats()["total_casts"] += 1
+        store.commit("bench", {PLAYER: ["balance", "total_casts"]})
+        store.commit_global()
+    store.close()
+
+def check_stale_global(directory):
+    """Regression check: saving over a newer but unchanged global_stats.json must keep every field."""
+    first, second = open_store(directory, True), open_store(directory, True)
+    first.global_stats()
+    second.commit_global()  # version 1, same counts
+    second.flush()
+    first.global_stats()["total_casts"] += 1
+    first.commit_global()
+    first.flush()
+    saved = open_store(directory, True).backend.load_global()
+    assert saved["total_casts"] == 1 and "rarities" in saved, f"global stats lost fields: {saved}"
+    first.close()
+    second.close()
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    processes = int(args[0]) if args else 8
+    updates = int(args[1]) if len(args) > 1 else 500
+    shared = "--no-lock" not in sys.argv
+    expected = processes * updates
+    with tempfile.TemporaryDirectory() as directory:
+        check_stale_global(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        start = multiprocessing.Event()
+        workers = [multiprocessing.Process(target=writer, args=(directory, updates, shared, start)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        began = time.perf_counter()
+        start.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - began
+        store = open_store(directory, shared)
+        record = store.get(PLAYER)
+        global_casts = store.global_stats()["total_casts"]
+        store.close()
+    balance = int(record["balance"]) if record else 0
+    casts = record["total_casts"] if record else 0
+    print(f"{processes} processes x {updates} updates ({'locked' if shared else 'unlocked'}) in {elapsed:.2f}s "
+          f"({expected / elapsed:,.0f} updates/s)")
+    print(f"balance {balance:,}/{expected:,}, player casts {casts:,}/{expected:,}, global casts {global_casts:,}/{expected:,}")
+    lost = 3 * expected - balance - casts - global_casts
+    print(f"lost updates: {lost:,}")
+    if shared and lost:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
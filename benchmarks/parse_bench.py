@@ -0,0 +1,79 @@
+"""Measure console.log parsing throughput in lines/s.
+
+Usage: python benchmarks/parse_bench.py [console.log] [repeat]
+
+Without a path a synthetic log is generated: mostly engine spam with a few
+percent chat lines, some of them commands.
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.parser import parse_chat_line
+
+COMMANDS = frozenset(["!fish", "!gamble", "!balance", "!stats", "!globalstats", "!shop", "!givemoney", "!commands"])
+
+SPAM = [
+    "CL:  CCSGO_BlurTarget: blur target changed",
+    "[SteamNetSockets] Ping measurement completed after 3.2s",
+    "SV:  Dropped client packet, sequence mismatch",
+    "Sound: pitch shifted sample weapons/ak47/ak47_01.vsnd",
+    "ChangeGameUIState: CSGO_GAME_UI_STATE_INGAME -> CSGO_GAME_UI_STATE_PAUSEMENU",
+    "[Client] CL_ParseServerInfo: num players 10, max 10",
+    "Material materials/dev/reflectivity_30.vmat not found!",
+]
+CHAT = [
+    "[ALL] {name}‎: gg",
+    "[CT] {name}‎ [DEAD]: nice shot",
+    "[ALL] {name}‎﹫Workshop: !fish",
+    "[T] {name}‎: !gamble 50%",
+    "[ALL] {name}‎: !givemoney someone 100",
+    "[ALL] {name}‎: !balance",
+]
+
+LEGACY_PATTERN = r"\[(?:ALL|(?:C)?(?:T)?)\]\s+(.*)‎(?:﹫\w+)?\s*(?:\[DEAD\])?:(?:\s)?(\S+)?\s(.*)?"
+
+def synthetic_log(count, chat_share=0.03, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        stamp = f"10/18 21:{i // 3600 % 60:02d}:{i // 60 % 60:02d}  "
+        if rng.random() < chat_share:
+            text = rng.choice(CHAT).format(name=f"player{rng.randrange(500)}")
+        else:
+            text = rng.choice(SPAM)
+        lines.append(stamp + text + "\n")
+    return lines
+
+def legacy_parse(line):
+    regex = re.search(LEGACY_PATTERN, line, flags=re.UNICODE)
+    return regex.group(2) if regex else None
+
+def measure(label, parse, lines, repeat):
+    start = time.perf_counter()
+    hits = 0
+    for _ in range(repeat):
+        for line in lines:
+            if parse(line):
+                hits += 1
+    elapsed = time.perf_counter() - start
+    total = len(lines) * repeat
+    print(f"{label:<8} {total / elapsed:>12,.0f} lines/s  ({hits // repeat} matches per pass)")
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8", errors="replace") as file:
+            lines = file.readlines()
+    else:
+        lines = synthetic_log(200_000)
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{len(lines):,} lines x {repeat}")
+    measure("legacy", legacy_parse, lines, repeat)
+    measure("parser", lambda line: parse_chat_line(line, COMMANDS), lines, repeat)
+
+if __name__ == "__main__":
+    main()
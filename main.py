@@ -1,159 +1,415 @@
 import time
-import re
 import os
 import sys
+import argparse
+import asyncio
+import threading
+import atexit
+import random
+import json
+import hashlib
+import functools
+from datetime import datetime, timezone
+from collections import Counter
 from dotenv import load_dotenv
-from modules.fish import cast_line, show_player_stats, show_global_stats_command, shop
+from modules.fish import begin_cast, set_clock, CAST_SUSPENSE, show_player_stats, show_leaderboard, show_global_stats_command, shop, get_fish_catalog
 from modules.economy import gamble, give_money
-from modules.utils import write_command, press_key, commands, get_balance, setup_logging, BASE_PATH, CONSOLE_FILE
+from modules.tailer import LogTailer
+from modules.cooldowns import CooldownTracker, load_cooldowns
+from modules.parser import parse_chat_line, log_time
+from modules.output import CaptureBackend
+from modules.metrics import METRICS, start_metrics_server
+from modules.profiling import Profiler
+from modules.utils import send_message, deliver_messages, set_output_sink, set_output_backend, create_output_backend, load_servers, server_path, OutputQueue, OUTPUT_FLUSH_SIZE, OUTPUT_FLUSH_LATENCY, OUTPUT_RATE, OUTPUT_STALE_AFTER, OUTPUT_MAX_DEPTH, PRIORITY_HIGH, commands, get_balance, load_player_stats, load_global_stats, use_memory_storage, setup_logging, show_error, compact_player_stats, import_json_stats, PLAYER_STORE, PRIVILEGED_USERNAME, is_privileged, BASE_PATH, READ_CURSOR_FILE, CATCHUP_MAX_AGE, CATCHUP_MAX_BYTES, METRICS_PORT, METRICS_LOG_INTERVAL, OUTPUT_BACKEND, uses_keypress
 import logging
-import tkinter as tk
-from tkinter import messagebox
 
 # Setup logging
 setup_logging()
 
 load_dotenv(os.path.join(BASE_PATH, '.env'))
 
-PRIVILEGED_USERNAME = os.getenv('PRIVILEGED_USERNAME')
 if not PRIVILEGED_USERNAME:
     logging.error("PRIVILEGED_USERNAME not set in .env. No user will have privileged access.")
-    PRIVILEGED_USERNAME = None
-else:
-    PRIVILEGED_USERNAME = PRIVILEGED_USERNAME.lower()
-
-COOLDOWNS = {
-    "!fish": 6.0,
-    "!gamble": 6.0,
-    "!balance": 6.0,
-    "!stats": 6.0,
-    "!globalstats": 6.0,
-    "!shop": 6.0,
-    "!givemoney": 6.0,
-    "!commands": 6.0
-}
-LAST_COMMAND_TIMES = {}
-
-def check_cooldown(username, command):
-    """Check if the player is on cooldown. Return (is_allowed, wait_time)."""
-    username_lower = username.lower()
-    if PRIVILEGED_USERNAME and username_lower == PRIVILEGED_USERNAME:
-        logging.debug(f"No cooldown for {command} for {username}")
-        return True, 0.0
-
-    cooldown_duration = COOLDOWNS.get(command, 0.0)
-    if cooldown_duration == 0.0:
-        logging.debug(f"No cooldown for {command} for {username}")
-        return True, 0.0
-
-    current_time = time.time()
-    for user in list(LAST_COMMAND_TIMES.keys()):
-        for cmd in list(LAST_COMMAND_TIMES[user].keys()):
-            if current_time - LAST_COMMAND_TIMES[user][cmd] > 60:
-                del LAST_COMMAND_TIMES[user][cmd]
-        if not LAST_COMMAND_TIMES[user]:
-            del LAST_COMMAND_TIMES[user]
 
-    if username_lower not in LAST_COMMAND_TIMES:
-        LAST_COMMAND_TIMES[username_lower] = {}
-    last_time = LAST_COMMAND_TIMES[username_lower].get(command, 0.0)
-    time_since_last = current_time - last_time
+COMMANDS = ["!fish", "!gamble", "!balance", "!stats", "!globalstats", "!shop", "!givemoney", "!commands", "!top", "!profile"]
+COMMAND_SET = frozenset(COMMANDS)
+COOLDOWNS = load_cooldowns(COMMANDS, os.getenv('COOLDOWN_DEFAULT', '6.0'))
+COOLDOWN_FILE = os.getenv('COOLDOWN_FILE')  # optional; keeps cooldowns across restarts
+if COOLDOWN_FILE and not os.path.isabs(COOLDOWN_FILE):
+    COOLDOWN_FILE = os.path.join(BASE_PATH, COOLDOWN_FILE)
+COOLDOWN_TRACKER = CooldownTracker(COOLDOWNS, COOLDOWN_FILE)
 
-    logging.debug(f"Checking cooldown for {username} ({username_lower}) on {command}. Last time: {last_time}, Current time: {current_time}, Time since last: {time_since_last}, Cooldown: {cooldown_duration}")
+PROFILE_COMMANDS = 100  # commands profiled by --profile or !profile without a count
+PROFILER = Profiler(BASE_PATH)  # reports land next to fish.log
 
-    if time_since_last >= cooldown_duration:
-        LAST_COMMAND_TIMES[username_lower][command] = current_time
-        logging.debug(f"Cooldown passed for {username} ({username_lower}) on {command}. Updated timestamp to {current_time}")
+def check_cooldown(username, command, now=None, tracker=None):
+    """Check if the player is on cooldown in tracker (default COOLDOWN_TRACKER). Return (is_allowed, wait_time)."""
+    username_lower = username.lower()
+    if is_privileged(username):
+        logging.debug("No cooldown for %s for %s", command, username)
         return True, 0.0
+
+    if tracker is None:
+        tracker = COOLDOWN_TRACKER
+    is_allowed, wait_time = tracker.check(username_lower, command, now)
+    if is_allowed:
+        logging.debug("Cooldown passed for %s (%s) on %s", username, username_lower, command)
     else:
-        wait_time = cooldown_duration - time_since_last
-        logging.debug(f"Cooldown active for {username} ({username_lower}) on {command}. Wait {wait_time} seconds")
-        return False, wait_time
-
-def listen(logFile):
-    logFile.seek(0, os.SEEK_END)
-    last_size = logFile.tell()
-    while True:
-        current_size = os.stat(logFile.name).st_size
-        if current_size < last_size:
-            logFile.seek(0, os.SEEK_SET)
-            last_size = current_size
-        line = logFile.readline()
-        if not line:
-            time.sleep(0.1)
-            continue
-        logging.debug(f"Read line: {line.strip()}")
-        parse(line)
-        last_size = logFile.tell()
-
-def parse(line):
-    regex = re.search(r"\[(?:ALL|(?:C)?(?:T)?)\]\s+(.*)‎(?:﹫\w+)?\s*(?:\[DEAD\])?:(?:\s)?(\S+)?\s(.*)?", line, flags=re.UNICODE)
-    if regex:
-        username = regex.group(1)
-        command = regex.group(2)
-        args = regex.group(3)
-    else:
-        username = ""
-        command = ""
-        args = ""
+        logging.debug("Cooldown active for %s (%s) on %s. Wait %s seconds", username, username_lower, command, wait_time)
+    return is_allowed, wait_time
 
-    logging.debug(f"Parsed command: username={username}, command={command}, args={args}")
+def parse_command(line, cooldowns=None):
+    """Return a ChatCommand for a registered chat command that is off cooldown, or None."""
+    with METRICS.time("fishbot_parse_seconds"):
+        return _parse_command(line, cooldowns)
 
-    if not command:
-        logging.debug("Skipping empty command")
-        return
+def _parse_command(line, cooldowns):
+    parsed = parse_chat_line(line, COMMAND_SET)
+    if parsed is None:
+        return None
+    logging.debug("Parsed command: username=%s, command=%s, args=%s", parsed.username, parsed.command, parsed.args)
 
-    is_allowed, wait_time = check_cooldown(username, command)
+    is_allowed, wait_time = check_cooldown(parsed.username, parsed.command, tracker=cooldowns)
     if not is_allowed:
-        logging.info(f"Command {command} from {username} blocked by cooldown. Wait {wait_time:.2f} seconds")
-        return
+        METRICS.inc("fishbot_cooldown_rejections_total", command=parsed.command)
+        logging.info("Command %s from %s blocked by cooldown. Wait %.2f seconds", parsed.command, parsed.username, wait_time)
+        return None
+    return parsed
+
+def run_command(username, command, args):
+    """Run a command's handler.
 
-    logging.info(f"Executing command: {command} from {username} with args: {args}")
+    Returns None, or a (delay, continuation) pair for commands such as !fish
+    whose second half must run delay seconds later.
+    """
+    logging.info("Executing command: %s from %s with args: %s", command, username, args)
+    METRICS.inc("fishbot_commands_total", command=command)
     match command:
         case "!fish":
-            logging.debug(f"Calling cast_line for {username}")
-            cast_line(username)
-            balance = get_balance(username.lower())
-            logging.info(f"Post-fish balance for {username.lower()}: {balance}")
+            logging.debug("Calling begin_cast for %s", username)
+            finish_cast = begin_cast(username)
+
+            def continuation():
+                finish_cast()
+                balance = get_balance(username.lower())
+                logging.debug("Post-fish balance for %s: %s", username.lower(), balance)
+            return CAST_SUSPENSE, continuation
         case "!gamble":
             if args:
-                logging.debug(f"Calling gamble for {username} with args: {args}")
+                logging.debug("Calling gamble for %s with args: %s", username, args)
                 gamble(username, args)
                 balance = get_balance(username.lower())
-                logging.info(f"Post-gamble balance for {username.lower()}: {balance}")
+                logging.debug("Post-gamble balance for %s: %s", username.lower(), balance)
             else:
-                write_command(f"say [GAMBLE] >> {username}: Please specify an amount, 'all', or percentage like 50%, e.g., !gamble 10, !gamble all, !gamble 50%")
-                press_key()
+                send_message(f"say [GAMBLE] >> {username}: Please specify an amount, 'all', or percentage like 50%, e.g., !gamble 10, !gamble all, !gamble 50%")
         case "!balance":
             balance = get_balance(username.lower())
-            write_command(f"say [BALANCE] >> {username}: Your current balance is ${round(balance, 2):,.2f}")
-            press_key()
+            send_message(f"say [BALANCE] >> {username}: Your current balance is ${round(balance, 2):,.2f}", PRIORITY_HIGH)
         case "!stats":
             show_player_stats(username)
         case "!globalstats":
             show_global_stats_command(username)
         case "!shop":
             shop(username, args)
+        case "!top":
+            show_leaderboard(username, args)
         case "!givemoney":
-            logging.debug(f"Calling give_money for {username} with args: {args}")
+            logging.debug("Calling give_money for %s with args: %s", username, args)
             give_money(username, args)
             balance = get_balance(username.lower())
-            logging.info(f"Post-givemoney balance for {username.lower()}: {balance}")
+            logging.debug("Post-givemoney balance for %s: %s", username.lower(), balance)
         case "!commands":
             commands(username)
+        case "!profile":
+            profile_command(username, args)
+    return None
+
+def profile_command(username, args):
+    """!profile [N|stop]: profile the next N commands from the live process (privileged only)."""
+    if not is_privileged(username):
+        logging.info("Profile request from %s ignored, not privileged", username)
+        return
+    if args.strip().lower() == "stop":
+        written = PROFILER.stop()
+        send_message(f"say [PROFILE] > {'Wrote ' + os.path.basename(written[0]) if written else 'Not profiling'}")
+        return
+    try:
+        count = int(args) if args.strip() else PROFILE_COMMANDS
+    except ValueError:
+        send_message("say [PROFILE] > Usage: !profile [commands|stop]")
+        return
+    if PROFILER.start(count):
+        send_message(f"say [PROFILE] > Profiling the next {count} commands")
+    else:
+        send_message(f"say [PROFILE] > Already profiling, {PROFILER.remaining} commands to go")
+
+def dispatch(username, command, args):
+    """run_command, profiled while the profiler is armed."""
+    return PROFILER.call(run_command, username, command, args, count=command != "!profile")
+
+def replay(path, seed):
+    """Run a recorded console.log through the handlers as fast as possible.
+
+    Stats live in memory only, output goes to a CaptureBackend instead of
+    the exec file and F1, cast suspense is skipped, and both cooldowns and the time of
+    day follow the log's own timestamps, so a given log and seed always
+    produce the same digest. Lines without a -condebug timestamp have no
+    timing to honour and skip the cooldown check. Returns (commands,
+    elapsed, latencies, digest), counting only the commands dispatched.
+    """
+    random.seed(seed)
+    use_memory_storage()
+    capture = CaptureBackend()
+    set_output_backend(capture)
+    latencies = []
+    current_time = 0.0
+    set_clock(lambda: datetime.fromtimestamp(current_time, timezone.utc))
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            line_start = time.perf_counter()
+            parsed = parse_chat_line(line, COMMAND_SET)
+            if parsed is None:
+                continue
+            if parsed.timestamp:
+                current_time = log_time(parsed.timestamp)
+                is_allowed, _ = check_cooldown(parsed.username, parsed.command, current_time)
+                if not is_allowed:
+                    continue
+            pending = dispatch(parsed.username, parsed.command, parsed.args)
+            if pending is not None:
+                PROFILER.call(pending[1])
+            latencies.append(time.perf_counter() - line_start)
+    elapsed = time.perf_counter() - start
+    state = {"players": load_player_stats(), "global": load_global_stats(), "output": capture.commands}
+    digest = hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+    return len(latencies), elapsed, latencies, digest
+
+def command_age(timestamp, now=None):
+    """Return seconds since a "MM/DD HH:MM:SS" log timestamp, which the game writes in local time."""
+    now = time.time() if now is None else now
+    age = log_time(time.strftime("%m/%d %H:%M:%S", time.localtime(now))) - log_time(timestamp)
+    if age < -86400:
+        age += 366 * 86400  # logged last year
+    return age
+
+def print_replay_report(commands, elapsed, latencies, digest):
+    print(f"Replayed {commands} commands in {elapsed:.3f}s ({commands / elapsed if elapsed else 0:,.0f} commands/s)")
+    if latencies:
+        ordered = sorted(latencies)
+        percentiles = ", ".join(
+            f"p{p}={ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1e6:,.0f}us" for p in (50, 90, 99)
+        )
+        print(f"Per-command latency: {percentiles}, max={ordered[-1] * 1e6:,.0f}us")
+    print(f"State digest: {digest}")
+
+class Channel:
+    """One game client: its console.log tailer, output queue and backend, and its own cooldowns.
+
+    Every channel shares the player store, so a player's balance is the
+    same on every server.
+    """
+
+    def __init__(self, index, tailer, backend, cooldowns):
+        self.index = index
+        self.tailer = tailer
+        self.backend = backend
+        self.cooldowns = cooldowns
+        self.output = OutputQueue(OUTPUT_FLUSH_SIZE, OUTPUT_FLUSH_LATENCY, OUTPUT_RATE, OUTPUT_STALE_AFTER, OUTPUT_MAX_DEPTH, channel=index)
+        self.cursor = None
+        self.saved_cursor = None
+        self.unfinished = Counter()  # start offset of each queued or running command's line -> count
+        self.finished = set()  # start offsets of commands that finished while an earlier one had not
+        self.caught_up = False
+
+    def checkpoint(self):
+        """Return the cursor to save: after every line read, or at the oldest command not yet finished.
+
+        In the second case the cursor lists the commands past that offset
+        which already finished under "done", so a restart skips them.
+        """
+        if self.cursor is None:
+            return None
+        if not self.unfinished:
+            self.finished.clear()
+            return self.cursor
+        offset = min(self.unfinished)
+        self.finished = {start for start in self.finished if start > offset}
+        return dict(self.cursor, offset=offset, done=sorted(self.finished))
+
+def build_channels(servers):
+    """Return a Channel per (console_file, exec_file) pair; server 1 uses the unsuffixed cooldown and cursor files."""
+    channels = []
+    for index, (console_file, exec_file) in enumerate(servers, 1):
+        cooldowns = COOLDOWN_TRACKER if index == 1 else CooldownTracker(COOLDOWNS, server_path(COOLDOWN_FILE, index))
+        tailer = LogTailer(console_file, cursor_path=server_path(READ_CURSOR_FILE, index) or None, catchup_bytes=CATCHUP_MAX_BYTES)
+        channels.append(Channel(index, tailer, create_output_backend(server=index, exec_file=exec_file), cooldowns))
+    return channels
+
+class CommandDispatcher:
+    """Runs the log tailers, per-player command workers and output writers as asyncio tasks.
+
+    Each channel's log is tailed by its own thread. Lines are parsed and
+    cooldown-checked in arrival order, then queued to a worker for that
+    player, so one player's commands run in order (even across servers)
+    while a cast's suspense delay or a slow keypress never holds up anyone
+    else. A worker answers on the channel the command came from, through
+    that channel's OutputQueue, whose writer task batches it.
+
+    Each tailer's read cursor is checkpointed once a second, right after the
+    player store is flushed. It never passes a command that is still queued
+    or waiting to reel in a cast, so a restart re-reads from the oldest
+    unfinished command and nothing is lost. Commands after it that had
+    already finished (other players') are saved with the cursor and not
+    run again. Backlog read on startup skips commands older than
+    CATCHUP_MAX_AGE seconds.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.player_queues = {}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+        background = [asyncio.create_task(self._flush_stats())]
+        for channel in self.channels:
+            threading.Thread(target=self._read_lines, args=(channel, loop, lines), daemon=True).start()
+            background.append(asyncio.create_task(channel.output.run(functools.partial(deliver_messages, backend=channel.backend))))
+        if METRICS_LOG_INTERVAL > 0:
+            background.append(asyncio.create_task(self._log_metrics()))
+        try:
+            while True:
+                channel, batch, starts, cursor = await lines.get()
+                backlog = not channel.caught_up and channel.tailer.backlog_end is not None
+                for line, start in zip(batch, starts):
+                    self.submit(channel, line, backlog, start)
+                channel.cursor = cursor
+                if backlog and cursor["offset"] >= channel.tailer.backlog_end:
+                    channel.caught_up = True
+                    logging.info("Caught up with %s", channel.tailer.path)
+        finally:
+            self._checkpoint()
+            for task in background:
+                task.cancel()
+
+    def _read_lines(self, channel, loop, lines):
+        # The tailer blocks on inotify/polling, so it runs in its own thread
+        for batch, starts, cursor in channel.tailer.follow_batches():
+            METRICS.inc("fishbot_lines_total", len(batch))
+            loop.call_soon_threadsafe(lines.put_nowait, (channel, batch, starts, cursor))
+
+    def submit(self, channel, line, backlog=False, start=0):
+        """Parse line and queue its command; start is the line's offset, held back from the checkpoint until it finishes."""
+        if backlog:
+            stale = parse_chat_line(line, COMMAND_SET)
+            if stale is not None and stale.timestamp and command_age(stale.timestamp) > CATCHUP_MAX_AGE:
+                logging.info("Skipping %s from %s at %s, older than %ss", stale.command, stale.username, stale.timestamp, CATCHUP_MAX_AGE)
+                return
+        parsed = PROFILER.call(parse_command, line, channel.cooldowns)
+        if parsed is None:
+            return
+        username_lower = parsed.username.lower()
+        queue = self.player_queues.get(username_lower)
+        if queue is None:
+            queue = self.player_queues[username_lower] = asyncio.Queue()
+            asyncio.create_task(self._player_worker(username_lower, queue))
+        channel.unfinished[start] += 1
+        queue.put_nowait((channel, parsed, start))
+
+    async def _player_worker(self, username_lower, queue):
+        while True:
+            channel, (username, command, args, _), start = await queue.get()
+            set_output_sink(channel.output.put)  # this task's context only
+            await channel.output.wait_for_room()  # a full queue holds commands back rather than dropping their replies
+            try:
+                pending = dispatch(username, command, args)
+                if pending is not None:
+                    delay, continuation = pending
+                    with METRICS.time("fishbot_sleep_seconds", reason="cast"):
+                        await asyncio.sleep(delay)
+                    PROFILER.call(continuation)
+            except Exception as e:
+                METRICS.inc("fishbot_errors_total", source=command)
+                logging.error("Error running %s for %s: %s", command, username, e)
+            channel.unfinished[start] -= 1
+            if not channel.unfinished[start]:
+                del channel.unfinished[start]
+                channel.finished.add(start)
+            if queue.empty():
+                del self.player_queues[username_lower]
+                return
+
+    async def _flush_stats(self):
+        while True:
+            await asyncio.sleep(1.0)
+            PLAYER_STORE.flush_if_due()
+            self._checkpoint()
+
+    def _checkpoint(self):
+        cursors = [(channel, channel.checkpoint()) for channel in self.channels]
+        changed = [(channel, cursor) for channel, cursor in cursors if cursor != channel.saved_cursor]
+        if not changed:
+            return
+        PLAYER_STORE.flush()  # effects of the finished commands reach disk before the cursors pass them
+        for channel, cursor in changed:
+            channel.tailer.save_cursor(cursor)
+            channel.saved_cursor = cursor
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            logging.info(METRICS.summary())
 
 if __name__ == '__main__':
-    # Check if console.log exists
-    if not os.path.exists(CONSOLE_FILE):
-        root = tk.Tk()
-        root.withdraw()  # Hide the main window
-        messagebox.showerror("Error", f"Console log file not found: {CONSOLE_FILE}\nPlease ensure the file exists in the same directory as the executable.")
-        root.destroy()
+    arg_parser = argparse.ArgumentParser(description="CS2 fishing chat bot")
+    arg_parser.add_argument("--compact", action="store_true", help="fold player_stats.ledger into player_stats.json and exit")
+    arg_parser.add_argument("--replay", metavar="CONSOLE_LOG", help="run a recorded console.log headlessly at full speed and report throughput")
+    arg_parser.add_argument("--seed", type=int, default=0, help="RNG seed for --replay")
+    arg_parser.add_argument("--import-json", action="store_true", help="copy player_stats.json and global_stats.json into STATS_DB_FILE and exit")
+    arg_parser.add_argument("--profile", metavar="COMMANDS", type=int, nargs="?", const=PROFILE_COMMANDS,
+                            help=f"profile the first COMMANDS commands (default {PROFILE_COMMANDS}) with cProfile and tracemalloc")
+    arg_parser.add_argument("--server", nargs=2, action="append", metavar=("CONSOLE_LOG", "EXEC_FILE"),
+                            help="tail this game client's console.log and answer through its exec file; repeat for several servers (default: CONSOLE_FILE/EXEC_FILE, CONSOLE_FILE_2/EXEC_FILE_2, ... from .env)")
+    cli_args = arg_parser.parse_args()
+    if cli_args.profile:
+        PROFILER.start(cli_args.profile)
+        atexit.register(PROFILER.stop)
+    if cli_args.compact:
+        compact_player_stats()
+        print("Compacted player stats ledger")
+        sys.exit(0)
+    if cli_args.replay:
+        print_replay_report(*replay(cli_args.replay, cli_args.seed))
+        sys.exit(0)
+    if cli_args.import_json:
+        imported = import_json_stats()
+        print(f"Imported {imported} players, set STORAGE_BACKEND=sqlite in .env to use them")
+        sys.exit(0)
+    servers = cli_args.server or load_servers()
+    if len(servers) > 1 and uses_keypress():
+        # F1 reaches only the focused window, so every server's batch would run in the same client
+        show_error(f"{len(servers)} servers configured, but OUTPUT_BACKEND={OUTPUT_BACKEND} answers by pressing F1 in the focused game window.\nSet OUTPUT_BACKEND to stdout or append to run several servers.")
         sys.exit(1)
-    log_file = open(CONSOLE_FILE, "r", encoding="utf-8")
+    # Check if every console.log exists
+    for console_file, _ in servers:
+        if not os.path.exists(console_file):
+            show_error(f"Console log file not found: {console_file}\nPlease ensure the file exists in the same directory as the executable.")
+            sys.exit(1)
+    get_fish_catalog()  # index fishbase.json once before the first cast
+    channels = build_channels(servers)
+    set_output_backend(channels[0].backend)
+    for channel in channels:
+        channel.cooldowns.load()
+        atexit.register(channel.cooldowns.save)
+    if len(channels) > 1:
+        logging.info("Multi-server mode: %s game clients sharing one economy", len(channels))
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    if METRICS_LOG_INTERVAL > 0:
+        atexit.register(lambda: logging.info(METRICS.summary()))
     try:
-        while True:
-            listen(log_file)
+        asyncio.run(CommandDispatcher(channels).run())
     except KeyboardInterrupt:
         logging.info("Script terminated by user")
         print("galls gone")
\ No newline at end of file
@@ -0,0 +1,98 @@
+import heapq
+import json
+import os
+import time
+import logging
+
+def load_cooldowns(commands, default):
+    """Return {command: seconds} from .env.
+
+    Each command reads COOLDOWN_<NAME>, e.g. COOLDOWN_FISH for !fish or
+    COOLDOWN_GIVEMONEY for !givemoney, falling back to default.
+    """
+    cooldowns = {}
+    for command in commands:
+        env_name = "COOLDOWN_" + command.lstrip("!").upper()
+        try:
+            cooldowns[command] = float(os.getenv(env_name, default))
+        except ValueError:
+            logging.error("Invalid %s in .env, using %s", env_name, default)
+            cooldowns[command] = float(default)
+    return cooldowns
+
+class CooldownTracker:
+    """Per-player, per-command cooldowns with an expiry heap.
+
+    last_used maps (username_lower, command) to the time the command last
+    ran. Each use also pushes (expires_at, key) onto a min-heap; purge()
+    pops only entries that have actually expired, so a check costs
+    amortized O(log n) instead of a sweep over every player. Heap entries
+    made stale by a newer use of the same key are skipped when popped.
+    """
+
+    def __init__(self, cooldowns, persist_path=None):
+        self.cooldowns = cooldowns
+        self.persist_path = persist_path
+        self.last_used = {}
+        self._expiries = []
+
+    def check(self, username, command, now=None):
+        """Return (is_allowed, wait_time) and record the use if allowed."""
+        cooldown_duration = self.cooldowns.get(command, 0.0)
+        if cooldown_duration <= 0.0:
+            return True, 0.0
+        now = time.time() if now is None else now
+        self.purge(now)
+        key = (username.lower(), command)
+        last_time = self.last_used.get(key)
+        if last_time is not None and now - last_time < cooldown_duration:
+            return False, cooldown_duration - (now - last_time)
+        self._record(key, now)
+        return True, 0.0
+
+    def _record(self, key, used_at):
+        self.last_used[key] = used_at
+        heapq.heappush(self._expiries, (used_at + self.cooldowns.get(key[1], 0.0), key))
+
+    def purge(self, now=None):
+        """Forget every use whose cooldown has expired."""
+        now = time.time() if now is None else now
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(expiries)
+            last_time = self.last_used.get(key)
+            if last_time is not None and last_time + self.cooldowns.get(key[1], 0.0) <= expires_at:
+                del self.last_used[key]
+
+    def __len__(self):
+        return len(self.last_used)
+
+    def save(self):
+        """Write active cooldowns to persist_path, if set."""
+        if not self.persist_path:
+            return
+        self.purge()
+        data = [[username, command, used_at] for (username, command), used_at in self.last_used.items()]
+        try:
+            tmp_file = self.persist_path + ".tmp"
+            with open(tmp_file, "w") as file:
+                json.dump(data, file)
+            os.replace(tmp_file, self.persist_path)
+            logging.debug("Saved %s cooldowns to %s", len(data), self.persist_path)
+        except IOError as e:
+            logging.error("Failed to save cooldowns to %s: %s", self.persist_path, e)
+
+    def load(self):
+        """Restore cooldowns saved by save(), skipping any that have expired."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r") as file:
+                data = json.load(file)
+        except (IOError, json.JSONDecodeError) as e:
+            logging.error("Failed to load cooldowns from %s: %s", self.persist_path, e)
+            return
+        for username, command, used_at in data:
+            self._record((username, command), used_at)
+        self.purge()
+        logging.info("Restored %s active cooldowns from %s", len(self.last_used), self.persist_path)
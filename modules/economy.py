@@ -1,104 +1,187 @@
-import json
-import random
-import os
-from dotenv import load_dotenv
-import logging
-from modules.utils import write_command, press_key, get_balance, update_balance, load_player_stats, get_display_username, BASE_PATH, load_balances
-
-load_dotenv(os.path.join(BASE_PATH, '.env'))
-
-def gamble(username, amount_str):
-    username_lower = username.lower()
-    display_username = get_display_username(username)
-    try:
-        current_balance = get_balance(username)
-        if current_balance <= 0:
-            write_command(f"say [GAMBLE] > {display_username}: You have no funds to gamble! Current balance: ${round(current_balance, 2):,.2f}")
-            press_key()
-            return
-        if amount_str.endswith("%"):
-            try:
-                percentage = float(amount_str[:-1])
-                if not 1 <= percentage <= 100:
-                    write_command(f"say [GAMBLE] > {display_username}: Percentage must be between 1% and 100%.")
-                    press_key()
-                    return
-                amount = (percentage / 100) * current_balance
-            except ValueError:
-                write_command(f"say [GAMBLE] > {display_username}: Invalid percentage. Use a number between 1% and 100%, e.g., !gamble 50%")
-                press_key()
-                return
-        elif amount_str.lower() == "all":
-            amount = current_balance
-        else:
-            amount = float(amount_str)
-        if amount <= 0:
-            write_command(f"say [GAMBLE] > {display_username}: Please enter a positive amount.")
-            press_key()
-            return
-        if amount > current_balance:
-            write_command(f"say [GAMBLE] > {display_username}: You don't have enough funds! Current balance: ${round(current_balance, 2):,.2f}")
-            press_key()
-            return
-        if random.random() < 0.5:
-            winnings = amount
-            update_balance(username, winnings)
-            write_command(f"say [GAMBLE] > {display_username}: ( ')< You won ${round(winnings, 2):,.2f}! New balance: ${round(get_balance(username), 2):,.2f}")
-        else:
-            update_balance(username, -amount)
-            write_command(f"say [GAMBLE] > {display_username}: ( ')> You lost ${round(amount, 2):,.2f}. New balance: ${round(get_balance(username), 2):,.2f}")
-        press_key()
-    except ValueError:
-        write_command(f"say [GAMBLE] > {display_username}: Invalid amount. Use a number, 'all', or percentage like 50%, e.g., !gamble 10, !gamble all, !gamble 50%")
-        press_key()
-
-def give_money(username, args):
-    username_lower = username.lower()
-    display_username = get_display_username(username)
-    if not args:
-        write_command(f"say [GIVEMONEY] > {display_username}: Please specify a player and amount, e.g., !givemoney Bob 100")
-        press_key()
-        return
-    try:
-        args_list = args.split()
-        if len(args_list) < 2:
-            write_command(f"say [GIVEMONEY] > {display_username}: Please specify a player and amount, e.g., !givemoney Bob 100")
-            press_key()
-            return
-        recipient = " ".join(args_list[:-1])
-        recipient_lower = recipient.lower()
-        amount_str = args_list[-1]
-        try:
-            amount = float(amount_str)
-            if amount <= 0:
-                write_command(f"say [GIVEMONEY] > {display_username}: Amount must be positive.")
-                press_key()
-                return
-        except ValueError:
-            write_command(f"say [GIVEMONEY] > {display_username}: Invalid amount. Use a number, e.g., !givemoney Bob 100")
-            press_key()
-            return
-        if username_lower == recipient_lower:
-            write_command(f"say [GIVEMONEY] > {display_username}: You cannot give money to yourself!")
-            press_key()
-            return
-        balances = load_balances()
-        player_stats = load_player_stats()
-        if recipient_lower not in balances and recipient_lower not in player_stats:
-            write_command(f"say [GIVEMONEY] > {display_username}: Player '{recipient}' not found!")
-            press_key()
-            return
-        recipient_display = get_display_username(recipient)
-        current_balance = get_balance(username)
-        if current_balance < amount:
-            write_command(f"say [GIVEMONEY] > {display_username}: Not enough funds! You have ${current_balance:,.2f}, need ${amount:,.2f}")
-            press_key()
-            return
-        update_balance(username, -amount)
-        update_balance(recipient, amount)
-        write_command(f"say [GIVEMONEY] > {display_username}: You gave ${amount:,.2f} to {recipient_display}! Your new balance: ${round(get_balance(username), 2):,.2f}")
-        press_key()
-    except Exception as e:
-        write_command(f"say [GIVEMONEY] > {display_username}: Error processing transfer. Please try again.")
-        press_key()
-        logging.error(f"Error in give_money for {username}: {e}")
+import json
+import math
+import random
+import os
+from dotenv import load_dotenv
+import logging
+from modules.metrics import METRICS, timed
+from modules.utils import send_message, get_balance, get_display_username, get_or_create_player, save_player_fields, find_player, default_player_stats, stats_lock, BASE_PATH
+
+load_dotenv(os.path.join(BASE_PATH, '.env'))
+
+PLAYER_FIELDS = frozenset(default_player_stats())
+
+class TransactionError(Exception):
+    """A transaction failed validation; none of its changes were applied."""
+
+class Transaction:
+    """Stage balance and field changes on one or more players and commit them together.
+
+    Changes are staged, not applied: balance adjustments are kept as
+    deltas and balance() reads through them. commit() takes the stats lock,
+    so the deltas land on the current balances even if another process
+    changed them meanwhile, validates every account (known fields, finite
+    changes, no negative balance) before touching any live record, then applies them
+    all as a single ledger record. Used as a context manager it commits on
+    a clean exit and discards everything if the block raises:
+
+        with Transaction("transfer") as tx:
+            tx.adjust_balance("bob", -10)
+            tx.adjust_balance("alice", 10)
+    """
+
+    def __init__(self, op):
+        self.op = op
+        self.changes = {}  # username_lower -> {field: new value}
+        self.deltas = {}  # username_lower -> balance change
+
+    def balance(self, username):
+        return get_balance(username) + self.deltas.get(username.lower(), 0.0)
+
+    def adjust_balance(self, username, amount):
+        username_lower = username.lower()
+        self.deltas[username_lower] = self.deltas.get(username_lower, 0.0) + float(amount)
+        self.changes.setdefault(username_lower, {})
+
+    def set(self, username, field, value):
+        if field == "balance":
+            self.adjust_balance(username, float(value) - self.balance(username))
+            return
+        self.changes.setdefault(username.lower(), {})[field] = value
+
+    def validate(self):
+        for username, fields in self.changes.items():
+            unknown = set(fields) - PLAYER_FIELDS
+            if unknown:
+                raise TransactionError(f"unknown fields {sorted(unknown)} for {username}")
+            delta = self.deltas.get(username, 0.0)
+            balance = self.balance(username)
+            if not (math.isfinite(delta) and math.isfinite(balance)):
+                raise TransactionError(f"{username} would get a non-finite balance change ({delta} to {balance})")
+            if balance < 0:
+                raise TransactionError(f"{username} would have a negative balance ({balance:,.2f})")
+
+    def commit(self):
+        """Validate, apply and record every staged change; raise TransactionError and apply nothing if invalid."""
+        if not self.changes:
+            return
+        with stats_lock():
+            self.validate()
+            changed = {}
+            for username, fields in self.changes.items():
+                changed[username] = list(fields)
+                if username in self.deltas:
+                    fields = dict(fields, balance=self.balance(username))
+                    changed[username].append("balance")
+                get_or_create_player(username).update(fields)
+            save_player_fields(self.op, changed)
+        logging.debug("Committed %s transaction for %s", self.op, ', '.join(self.changes))
+        self.changes = {}
+        self.deltas = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.changes = {}
+            self.deltas = {}
+        return False
+
+@timed("fishbot_handler_seconds", handler="gamble")
+def gamble(username, amount_str):
+    username_lower = username.lower()
+    display_username = get_display_username(username)
+    try:
+        current_balance = get_balance(username)
+        if current_balance <= 0:
+            send_message(f"say [GAMBLE] > {display_username}: You have no funds to gamble! Current balance: ${round(current_balance, 2):,.2f}")
+            return
+        if amount_str.endswith("%"):
+            try:
+                percentage = float(amount_str[:-1])
+                if not 1 <= percentage <= 100:
+                    send_message(f"say [GAMBLE] > {display_username}: Percentage must be between 1% and 100%.")
+                    return
+                amount = (percentage / 100) * current_balance
+            except ValueError:
+                send_message(f"say [GAMBLE] > {display_username}: Invalid percentage. Use a number between 1% and 100%, e.g., !gamble 50%")
+                return
+        elif amount_str.lower() == "all":
+            amount = current_balance
+        else:
+            amount = float(amount_str)
+            if not math.isfinite(amount):
+                raise ValueError(f"non-finite amount {amount_str!r}")
+        if amount <= 0:
+            send_message(f"say [GAMBLE] > {display_username}: Please enter a positive amount.")
+            return
+        if amount > current_balance:
+            send_message(f"say [GAMBLE] > {display_username}: You don't have enough funds! Current balance: ${round(current_balance, 2):,.2f}")
+            return
+        if random.random() < 0.5:
+            winnings = amount
+            with Transaction("gamble") as tx:
+                tx.adjust_balance(username, winnings)
+            send_message(f"say [GAMBLE] > {display_username}: ( ')< You won ${round(winnings, 2):,.2f}! New balance: ${round(get_balance(username), 2):,.2f}")
+        else:
+            with Transaction("gamble") as tx:
+                tx.adjust_balance(username, -amount)
+            send_message(f"say [GAMBLE] > {display_username}: ( ')> You lost ${round(amount, 2):,.2f}. New balance: ${round(get_balance(username), 2):,.2f}")
+    except ValueError:
+        send_message(f"say [GAMBLE] > {display_username}: Invalid amount. Use a number, 'all', or percentage like 50%, e.g., !gamble 10, !gamble all, !gamble 50%")
+    except TransactionError:  # the balance dropped (e.g. another server's bot) between the check and the commit
+        send_message(f"say [GAMBLE] > {display_username}: You don't have enough funds! Current balance: ${round(get_balance(username), 2):,.2f}")
+
+@timed("fishbot_handler_seconds", handler="give_money")
+def give_money(username, args):
+    username_lower = username.lower()
+    display_username = get_display_username(username)
+    if not args:
+        send_message(f"say [GIVEMONEY] > {display_username}: Please specify a player and amount, e.g., !givemoney Bob 100")
+        return
+    try:
+        args_list = args.split()
+        if len(args_list) < 2:
+            send_message(f"say [GIVEMONEY] > {display_username}: Please specify a player and amount, e.g., !givemoney Bob 100")
+            return
+        recipient = " ".join(args_list[:-1])
+        amount_str = args_list[-1]
+        try:
+            amount = float(amount_str)
+            if not math.isfinite(amount):
+                raise ValueError(f"non-finite amount {amount_str!r}")
+            if amount <= 0:
+                send_message(f"say [GIVEMONEY] > {display_username}: Amount must be positive.")
+                return
+        except ValueError:
+            send_message(f"say [GIVEMONEY] > {display_username}: Invalid amount. Use a number, e.g., !givemoney Bob 100")
+            return
+        recipient_lower, candidates = find_player(recipient)
+        if recipient_lower is None:
+            if candidates:
+                names = ", ".join(get_display_username(candidate) for candidate in candidates)
+                send_message(f"say [GIVEMONEY] > {display_username}: '{recipient}' matches several players ({names}), please be more specific.")
+            else:
+                send_message(f"say [GIVEMONEY] > {display_username}: Player '{recipient}' not found!")
+            return
+        if username_lower == recipient_lower:
+            send_message(f"say [GIVEMONEY] > {display_username}: You cannot give money to yourself!")
+            return
+        recipient_display = get_display_username(recipient_lower)
+        current_balance = get_balance(username)
+        transfer = Transaction("transfer")
+        transfer.adjust_balance(username_lower, -amount)
+        transfer.adjust_balance(recipient_lower, amount)
+        try:
+            transfer.commit()
+        except TransactionError:
+            send_message(f"say [GIVEMONEY] > {display_username}: Not enough funds! You have ${current_balance:,.2f}, need ${amount:,.2f}")
+            return
+        send_message(f"say [GIVEMONEY] > {display_username}: You gave ${amount:,.2f} to {recipient_display}! Your new balance: ${round(get_balance(username), 2):,.2f}")
+    except Exception as e:
+        send_message(f"say [GIVEMONEY] > {display_username}: Error processing transfer. Please try again.")
+        METRICS.inc("fishbot_errors_total", source="!givemoney")
+        logging.error("Error in give_money for %s: %s", username, e)
@@ -1,9 +1,10 @@
 import json
 import random
-import time
-import os
 from datetime import datetime
-from modules.utils import write_command, press_key, get_balance, update_balance, load_player_stats, save_player_stats, get_display_username, BASE_PATH, FISHBASE_FILE, GLOBAL_STATS_FILE
+from functools import lru_cache
+from modules.utils import send_message, PRIORITY_LOW, get_balance, load_player_stats, get_or_create_player, save_player_fields, get_display_username, load_global_stats, save_global_stats, is_privileged, get_leaderboard, PRIVILEGED_USERNAME, FISHBASE_FILE
+from modules.metrics import METRICS, timed
+from modules.economy import Transaction, TransactionError
 from enum import Enum
 import logging
 
@@ -57,149 +58,67 @@ class FishWeight:
         self.Min = 0.0
         self.Max = 0.0
 
-def load_global_stats():
-    default_stats = {
-        "total_casts": 0,
-        "total_fish_caught": 0,
-        "rarities": {
-            "Common": 0,
-            "Uncommon": 0,
-            "Rare": 0,
-            "Very Rare": 0,
-            "Epic": 0,
-            "Legendary": 0
-        }
-    }
-    if os.path.exists(GLOBAL_STATS_FILE):
-        try:
-            with open(GLOBAL_STATS_FILE, "r") as file:
-                stats = json.load(file)
-                for key in default_stats:
-                    if key not in stats:
-                        stats[key] = default_stats[key]
-                for rarity in default_stats["rarities"]:
-                    if rarity not in stats["rarities"]:
-                        stats["rarities"][rarity] = 0
-                logging.debug(f"Loaded global stats: {stats}")
-                return stats
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error loading global stats: {e}")
-            return default_stats
-    logging.debug("Global stats file not found, using default stats")
-    return default_stats
-
-def save_global_stats(stats):
-    try:
-        with open(GLOBAL_STATS_FILE, "w") as file:
-            json.dump(stats, file, indent=2)
-        logging.debug(f"Saved global stats: {stats}")
-    except IOError as e:
-        logging.error(f"Error saving global stats: {e}")
+CAST_SUSPENSE = 1.0  # seconds between casting and reeling in
 
-def cast_line(username):
+@timed("fishbot_handler_seconds", handler="begin_cast")
+def begin_cast(username):
+    """Announce a cast and return the function that reels it in after CAST_SUSPENSE seconds."""
     username_lower = username.lower()
     display_username = get_display_username(username)
-    global_stats = load_global_stats()
-    global_stats["total_casts"] += 1
-    player_stats = load_player_stats()
-    if username_lower not in player_stats:
-        player_stats[username_lower] = {
-            "balance": 0.0,
-            "total_casts": 0,
-            "total_fish_caught": 0,
-            "rarities": {
-                "Common": 0,
-                "Uncommon": 0,
-                "Rare": 0,
-                "Very Rare": 0,
-                "Epic": 0,
-                "Legendary": 0
-            },
-            "equipped_rod": "Old Rod",
-            "equipped_bait": "Worm",
-            "original_username": username
-        }
-    player_stats[username_lower]["total_casts"] += 1
-    equipped_rod = player_stats[username_lower]["equipped_rod"]
-    equipped_bait = player_stats[username_lower]["equipped_bait"]
+    player = get_or_create_player(username)
+    equipped_rod = player["equipped_rod"]
+    equipped_bait = player["equipped_bait"]
     rod_stats = FISHING_RODS.get(equipped_rod, FISHING_RODS["Old Rod"])
     bait_stats = FISHING_BAITS.get(equipped_bait, FISHING_BAITS["Worm"])
     catch_rate = min(1.0, rod_stats["catch_rate"] + bait_stats["catch_rate_boost"])
     combined_rarity_modifier = rod_stats["rarity_modifier"] * bait_stats["rarity_modifier"]
     weather = get_weather()
-    write_command(f"say [GOFISH] ♌︎ {display_username} is casting their line with {weather[1]} using {equipped_rod} and {equipped_bait}...")
-    press_key()
-    time.sleep(1)
-    if random.random() > catch_rate:
-        write_command(f"say [GOFISH] > {display_username}: (ó﹏ò｡) You didn't catch anything, try again later...")
-        press_key()
-    else:
-        fish_name, price, weight = get_fish_result(weather[0], combined_rarity_modifier)
-        global_stats["total_fish_caught"] += 1
-        player_stats[username_lower]["total_fish_caught"] += 1
-        fish_data = load_fish_db()
-        chosen_rarity = None
-        for category in fish_data["Categories"]:
-            if any(fish["Name"] == fish_name for fish in category["FishList"]):
-                chosen_rarity = category["Rarity"]
-                break
-        if chosen_rarity:
+    send_message(f"say [GOFISH] ♌︎ {display_username} is casting their line with {weather[1]} using {equipped_rod} and {equipped_bait}...", PRIORITY_LOW)
+
+    @timed("fishbot_handler_seconds", handler="finish_cast")
+    def finish_cast():
+        player["total_casts"] += 1  # counted when reeled in, so a cast cut short by shutdown leaves no trace
+        global_stats = load_global_stats()
+        global_stats["total_casts"] += 1
+        if random.random() > catch_rate:
+            save_player_fields("cast", {username_lower: ["total_casts"]})
+            send_message(f"say [GOFISH] > {display_username}: (ó﹏ò｡) You didn't catch anything, try again later...")
+        else:
+            fish_name, price, weight, chosen_rarity = get_fish_result(weather[0], combined_rarity_modifier)
+            global_stats["total_fish_caught"] += 1
+            player["total_fish_caught"] += 1
             global_stats["rarities"][chosen_rarity] += 1
-            player_stats[username_lower]["rarities"][chosen_rarity] += 1
-        logging.debug(f"Calling update_balance for {username_lower} with price: {price}")
-        update_balance(username_lower, price)
-        # Reload player_stats to merge balance update
-        player_stats = load_player_stats()
-        logging.debug(f"Reloaded player_stats after update_balance for {username_lower}: {player_stats.get(username_lower, {})}")
-        write_command(f"say [GOFISH] > {display_username}: <>< You caught a ({chosen_rarity}) {fish_name}! It weighs {round(weight, 2)}lbs and is worth around ${round(price, 2):,.2f}. New balance: ${round(get_balance(username_lower), 2):,.2f}")
-        press_key()
-    logging.debug(f"Saving player_stats for {username_lower} before final save: {player_stats.get(username_lower, {})}")
-    save_global_stats(global_stats)
-    save_player_stats(player_stats)
+            player["rarities"][chosen_rarity] += 1
+            player["balance"] += price
+            save_player_fields("catch", {username_lower: ["total_casts", "total_fish_caught", "rarities", "balance"]})
+            send_message(f"say [GOFISH] > {display_username}: <>< You caught a ({chosen_rarity}) {fish_name}! It weighs {round(weight, 2)}lbs and is worth around ${round(price, 2):,.2f}. New balance: ${round(get_balance(username_lower), 2):,.2f}")
+        save_global_stats(global_stats)
+
+    return finish_cast
 
+@timed("fishbot_handler_seconds", handler="shop")
 def shop(username, args=None):
     username_lower = username.lower()
     display_username = get_display_username(username)
     args_lower = args.lower() if args else ""
-    player_stats = load_player_stats()
-    
-    if username_lower not in player_stats:
-        player_stats[username_lower] = {
-            "balance": 0.0,
-            "total_casts": 0,
-            "total_fish_caught": 0,
-            "rarities": {
-                "Common": 0,
-                "Uncommon": 0,
-                "Rare": 0,
-                "Very Rare": 0,
-                "Epic": 0,
-                "Legendary": 0
-            },
-            "equipped_rod": "Old Rod",
-            "equipped_bait": "Worm",
-            "original_username": username
-        }
 
     if args_lower == "bait":
         bait_list = [
             f"{bait}: ${bait_stats['price']:,.2f} (Catch Rate Boost: +{bait_stats['catch_rate_boost']*100:.2f}%, Rarity Boost: {bait_stats['rarity_modifier']:.2f}x)"
             for bait, bait_stats in FISHING_BAITS.items() if bait != "Worm"
         ]
-        write_command(
+        send_message(
             f"say [SHOP] > Baits - {', '.join(bait_list)}. Use !shop buy <bait_name>. See rods with !shop"
         )
-        press_key()
         return
     if not args:
         rod_list = [
             f"{rod}: ${rod_stats['price']:,.2f} (Catch Rate: {rod_stats['catch_rate']*100:.2f}%, Rarity Boost: {rod_stats['rarity_modifier']:.2f}x)"
             for rod, rod_stats in FISHING_RODS.items() if rod != "Old Rod"
         ]
-        write_command(
+        send_message(
             f"say [SHOP] > Rods - {', '.join(rod_list)}. Use !shop buy <rod_name>."
         )
-        press_key()
         return
     if args_lower.startswith("buy "):
         item_name = " ".join(args.split()[1:]).title()
@@ -208,65 +127,55 @@ def shop(username, args=None):
             rod_stats = FISHING_RODS[item_name]
             price = rod_stats["price"]
             if price == 0.0:
-                write_command(f"say [SHOP] > {display_username}: The Old Rod is free and already equipped by default!")
-                press_key()
+                send_message(f"say [SHOP] > {display_username}: The Old Rod is free and already equipped by default!")
                 return
-            if current_balance < price:
-                write_command(f"say [SHOP] > {display_username}: Not enough funds! Need ${price:,.2f}, you have ${current_balance:,.2f}")
-                press_key()
+            logging.debug("Deducting rod price for %s: %s", username_lower, price)
+            purchase = Transaction("purchase")
+            purchase.adjust_balance(username, -price)
+            purchase.set(username, "equipped_rod", item_name)
+            try:
+                purchase.commit()
+            except TransactionError:
+                send_message(f"say [SHOP] > {display_username}: Not enough funds! Need ${price:,.2f}, you have ${current_balance:,.2f}")
                 return
-            logging.debug(f"Calling update_balance for {username_lower} to deduct rod price: {price}")
-            update_balance(username_lower, -price)
-            player_stats = load_player_stats()
-            player_stats[username_lower]["equipped_rod"] = item_name
-            logging.debug(f"Reloaded player_stats after update_balance for {username_lower}: {player_stats.get(username_lower, {})}")
-            save_player_stats(player_stats)
-            write_command(f"say [SHOP] > {display_username}: You bought {item_name} for ${price:,.2f}! It’s now equipped. New balance: ${round(get_balance(username_lower), 2):,.2f}")
-            press_key()
+            send_message(f"say [SHOP] > {display_username}: You bought {item_name} for ${price:,.2f}! It’s now equipped. New balance: ${round(get_balance(username_lower), 2):,.2f}")
             return
         if item_name in FISHING_BAITS:
             bait_stats = FISHING_BAITS[item_name]
             price = bait_stats["price"]
             if price == 0.0:
-                write_command(f"say [SHOP] > {display_username}: Worm bait is free and already equipped by default!")
-                press_key()
+                send_message(f"say [SHOP] > {display_username}: Worm bait is free and already equipped by default!")
                 return
-            if current_balance < price:
-                write_command(f"say [SHOP] > {display_username}: Not enough funds! Need ${price:,.2f}, you have ${current_balance:,.2f}")
-                press_key()
+            logging.debug("Deducting bait price for %s: %s", username_lower, price)
+            purchase = Transaction("purchase")
+            purchase.adjust_balance(username, -price)
+            purchase.set(username, "equipped_bait", item_name)
+            try:
+                purchase.commit()
+            except TransactionError:
+                send_message(f"say [SHOP] > {display_username}: Not enough funds! Need ${price:,.2f}, you have ${current_balance:,.2f}")
                 return
-            logging.debug(f"Calling update_balance for {username_lower} to deduct bait price: {price}")
-            update_balance(username_lower, -price)
-            player_stats = load_player_stats()
-            player_stats[username_lower]["equipped_bait"] = item_name
-            logging.debug(f"Reloaded player_stats after update_balance for {username_lower}: {player_stats.get(username_lower, {})}")
-            save_player_stats(player_stats)
-            write_command(f"say [SHOP] > {display_username}: You bought {item_name} bait for ${price:,.2f}! It’s now equipped. New balance: ${round(get_balance(username_lower), 2):,.2f}")
-            press_key()
+            send_message(f"say [SHOP] > {display_username}: You bought {item_name} bait for ${price:,.2f}! It’s now equipped. New balance: ${round(get_balance(username_lower), 2):,.2f}")
             return
-        write_command(f"say [SHOP] > {display_username}: Invalid item name. See baits with !shop bait, See rods with !shop")
-        press_key()
+        send_message(f"say [SHOP] > {display_username}: Invalid item name. See baits with !shop bait, See rods with !shop")
         return
-    write_command(f"say [SHOP] > {display_username}: Invalid command. Use !shop, !shop bait, or !shop buy <item_name>")
-    press_key()
+    send_message(f"say [SHOP] > {display_username}: Invalid command. Use !shop, !shop bait, or !shop buy <item_name>")
 
+@timed("fishbot_handler_seconds", handler="show_global_stats_command")
 def show_global_stats_command(username):
-    from main import PRIVILEGED_USERNAME
     username_lower = username.lower()
     display_username = get_display_username(username)
-    logging.debug(f"Global stats requested by {username}")
-    if not PRIVILEGED_USERNAME or username_lower != PRIVILEGED_USERNAME:
+    logging.debug("Global stats requested by %s", username)
+    if not is_privileged(username):
         privileged_name = PRIVILEGED_USERNAME if PRIVILEGED_USERNAME else "the configured user"
-        write_command(f"say [GLOBALSTATS] > {display_username}: Only {privileged_name} can use !globalstats.")
-        press_key()
-        logging.debug(f"Global stats access denied for {username}")
+        send_message(f"say [GLOBALSTATS] > {display_username}: Only {privileged_name} can use !globalstats.")
+        logging.debug("Global stats access denied for %s", username)
         return
     try:
         stats = load_global_stats()
-        player_stats = load_player_stats()
-        total_anglers = len(player_stats)
+        total_anglers = stats["total_anglers"]
         rarities = stats["rarities"]
-        write_command(
+        send_message(
             f"say [GLOBALSTATS] Global Fishing Stats: Total Anglers: {total_anglers}, "
             f"Total Casts: {stats['total_casts']}, "
             f"Total Fish Caught: {stats['total_fish_caught']}, "
@@ -274,29 +183,28 @@ def show_global_stats_command(username):
             f"Rare: {rarities['Rare']}, Very Rare: {rarities['Very Rare']}, "
             f"Epic: {rarities['Epic']}, Legendary: {rarities['Legendary']}"
         )
-        press_key()
-        logging.debug(f"Displayed global stats for {username}: {stats}, Total Anglers: {total_anglers}")
+        logging.debug("Displayed global stats for %s", username)
     except Exception as e:
-        write_command(f"say [GLOBALSTATS] > {display_username}: Error retrieving global stats. Please try again later.")
-        press_key()
-        logging.error(f"Error in show_global_stats_command for {username}: {e}")
+        send_message(f"say [GLOBALSTATS] > {display_username}: Error retrieving global stats. Please try again later.")
+        METRICS.inc("fishbot_errors_total", source="!globalstats")
+        logging.error("Error in show_global_stats_command for %s: %s", username, e)
 
+@timed("fishbot_handler_seconds", handler="show_player_stats")
 def show_player_stats(username):
     username_lower = username.lower()
     display_username = get_display_username(username)
-    logging.debug(f"Player stats requested by {username}")
+    logging.debug("Player stats requested by %s", username)
     try:
         stats = load_player_stats()
         if username_lower not in stats:
-            write_command(f"say [STATS] > {display_username}: No stats available. Try fishing first!")
-            press_key()
-            logging.debug(f"No stats for {username}")
+            send_message(f"say [STATS] > {display_username}: No stats available. Try fishing first!")
+            logging.debug("No stats for %s", username)
             return
         player_data = stats[username_lower]
         rarities = player_data["rarities"]
         equipped_rod = player_data["equipped_rod"]
         equipped_bait = player_data["equipped_bait"]
-        write_command(
+        send_message(
             f"say [STATS] {display_username}'s Stats: Equipped Rod: {equipped_rod}, Equipped Bait: {equipped_bait}, "
             f"Balance: ${round(player_data['balance'], 2):,.2f}, "
             f"Total Casts: {player_data['total_casts']}, "
@@ -305,12 +213,35 @@ def show_player_stats(username):
             f"Rare: {rarities['Rare']}, Very Rare: {rarities['Very Rare']}, "
             f"Epic: {rarities['Epic']}, Legendary: {rarities['Legendary']}"
         )
-        press_key()
-        logging.debug(f"Displayed player stats for {username}: {player_data}")
+        logging.debug("Displayed player stats for %s", username)
     except Exception as e:
-        write_command(f"say [STATS] > {display_username}: Error retrieving stats. Please try again later.")
-        press_key()
-        logging.error(f"Error in show_player_stats for {username}: {e}")
+        send_message(f"say [STATS] > {display_username}: Error retrieving stats. Please try again later.")
+        METRICS.inc("fishbot_errors_total", source="!stats")
+        logging.error("Error in show_player_stats for %s: %s", username, e)
+
+TOP_COUNT = 5  # players listed by !top
+
+@timed("fishbot_handler_seconds", handler="show_leaderboard")
+def show_leaderboard(username, args=None):
+    username_lower = username.lower()
+    display_username = get_display_username(username)
+    board_name = (args or "balance").strip().lower()
+    leaderboard = get_leaderboard(board_name)
+    if leaderboard is None:
+        send_message(f"say [TOP] > {display_username}: Unknown leaderboard. Use !top balance, !top fish or !top legendary")
+        return
+    entries = leaderboard.top(TOP_COUNT)
+    if not entries:
+        send_message(f"say [TOP] > Nobody is on the {board_name} leaderboard yet. Go fish!")
+        return
+    if board_name == "balance":
+        ranking = ", ".join(f"{position}. {get_display_username(name)} ${round(score, 2):,.2f}" for position, (name, score) in enumerate(entries, 1))
+    else:
+        ranking = ", ".join(f"{position}. {get_display_username(name)} ({score:,})" for position, (name, score) in enumerate(entries, 1))
+    rank = leaderboard.rank(username_lower)
+    suffix = f" | {display_username}: #{rank}" if rank else ""
+    send_message(f"say [TOP] {board_name.title()}: {ranking}{suffix}")
+    logging.debug("Displayed %s leaderboard for %s", board_name, username)
 
 def load_fish_db():
     try:
@@ -319,45 +250,79 @@ def load_fish_db():
             fish_data = json.loads(json_data)
         return fish_data
     except (IOError, json.JSONDecodeError) as e:
-        logging.error(f"Error loading fishbase.json: {e}")
+        logging.error("Error loading fishbase.json: %s", e)
         raise ValueError("Failed to load fish database")
 
+class FishCatalog:
+    """Lookup tables over fishbase.json, built once instead of per cast."""
+
+    def __init__(self, fish_data):
+        self.categories = fish_data["Categories"]
+        self.rarities = tuple(category["Rarity"] for category in self.categories)
+        self.fish_by_rarity = {category["Rarity"]: category["FishList"] for category in self.categories}
+        self.fish_by_name = {}
+        for category in self.categories:
+            for fish in category["FishList"]:
+                self.fish_by_name[fish["Name"]] = {
+                    "rarity": category["Rarity"],
+                    "price": fish["Price"],
+                    "min_weight": fish["Weight"]["Min"],
+                    "max_weight": fish["Weight"]["Max"]
+                }
+        logging.info("Indexed %s fish in %s rarities", len(self.fish_by_name), len(self.rarities))
+
+_fish_catalog = None
+
+def get_fish_catalog():
+    """Return the fish catalog, loading fishbase.json on first use."""
+    global _fish_catalog
+    if _fish_catalog is None:
+        _fish_catalog = FishCatalog(load_fish_db())
+    return _fish_catalog
+
 def get_fish_result(sea_weather, combined_rarity_modifier):
-    fish_data = load_fish_db()
-    if fish_data:
-        weather_modifier = get_rarity_modifier(sea_weather)
-        total_modifier = weather_modifier * combined_rarity_modifier
-        rarity_roll = random.random()
-        chosen_rarity = choose_rarity(rarity_roll, fish_data["Categories"], total_modifier)
-        chosen_category = next((category for category in fish_data["Categories"] if category["Rarity"] == chosen_rarity), None)
-        if chosen_category:
-            fish_list = chosen_category["FishList"]
-            chosen_fish = random.choice(fish_list)
-            random_weight = random.uniform(chosen_fish["Weight"]["Min"], chosen_fish["Weight"]["Max"])
-            usd_price = chosen_fish["Price"] * random_weight
-            return chosen_fish["Name"], usd_price, random_weight
-    else:
-        raise ValueError("fishData was null")
+    """Pick a fish and weight; return (name, price, weight, rarity)."""
+    catalog = get_fish_catalog()
+    weather_modifier = get_rarity_modifier(sea_weather)
+    total_modifier = weather_modifier * combined_rarity_modifier
+    chosen_rarity = choose_rarity(catalog.rarities, total_modifier)
+    fish_list = catalog.fish_by_rarity.get(chosen_rarity)
+    if not fish_list:
+        raise ValueError(f"No fish for rarity {chosen_rarity}")
+    chosen_fish = random.choice(fish_list)
+    random_weight = random.uniform(chosen_fish["Weight"]["Min"], chosen_fish["Weight"]["Max"])
+    usd_price = chosen_fish["Price"] * random_weight
+    return chosen_fish["Name"], usd_price, random_weight, chosen_rarity
 
 def get_weather():
     forecasted_weather = forecast_sea_weather()
     weather_description = get_weather_description(forecasted_weather)
     return forecasted_weather, weather_description
 
+BASE_WEATHER = {
+    TimeOfDay.Morning: SeaWeatherCondition.ClearSkies,
+    TimeOfDay.Afternoon: SeaWeatherCondition.PartlyCloudy,
+    TimeOfDay.Evening: SeaWeatherCondition.Overcast,
+    TimeOfDay.Night: SeaWeatherCondition.ClearSkies,
+}
+WEATHER_CHANGE_CHANCE = 0.25
+
 def forecast_sea_weather():
     current_time_of_day = get_current_time_of_day()
-    base_condition = {
-        TimeOfDay.Morning: SeaWeatherCondition.ClearSkies,
-        TimeOfDay.Afternoon: SeaWeatherCondition.PartlyCloudy,
-        TimeOfDay.Evening: SeaWeatherCondition.Overcast,
-        TimeOfDay.Night: SeaWeatherCondition.ClearSkies,
-    }.get(current_time_of_day, SeaWeatherCondition.ClearSkies)
-    if random.random() <= 0.25:
+    base_condition = BASE_WEATHER.get(current_time_of_day, SeaWeatherCondition.ClearSkies)
+    if random.random() <= WEATHER_CHANGE_CHANCE:
         base_condition = random.choice(list(SeaWeatherCondition))
     return base_condition
 
+_clock = datetime.now
+
+def set_clock(clock):
+    """Use clock() instead of datetime.now for the time of day, e.g. log time during a replay."""
+    global _clock
+    _clock = clock
+
 def get_current_time_of_day():
-    current_hour = datetime.now().hour
+    current_hour = _clock().hour
     if 6 <= current_hour < 12:
         return TimeOfDay.Morning
     elif 12 <= current_hour < 18:
@@ -391,18 +356,67 @@ def get_rarity_modifier(sea_weather):
         SeaWeatherCondition.Calm: 1.1,
     }.get(sea_weather, 1.0)
 
-def choose_rarity(roll, categories, modifier):
-    probabilities = [rarity_chance(category["Rarity"]) * modifier for category in categories]
-    total = sum(probabilities)
-    if total == 0:
-        return categories[-1]["Rarity"]
-    probabilities = [p / total for p in probabilities]
-    cumulative_chance = 0.0
-    for i, prob in enumerate(probabilities):
-        cumulative_chance += prob
-        if roll <= cumulative_chance:
-            return categories[i]["Rarity"]
-    return categories[-1]["Rarity"]
+def rarity_weights(rarities, modifier):
+    """Return unnormalized draw weights for rarities under a rarity modifier.
+
+    Rarities are ranked from most to least common by rarity_chance. The most
+    common tier keeps its base chance, the rarest has its chance multiplied
+    by modifier, and the tiers in between are scaled geometrically:
+
+        weight(tier) = rarity_chance(tier) * modifier ** (rank / (len(rarities) - 1))
+
+    A modifier above 1.0 shifts draws toward rarer fish, below 1.0 toward
+    common ones, and exactly 1.0 gives the base table.
+    """
+    ranked = sorted(rarities, key=rarity_chance, reverse=True)
+    steps = max(len(ranked) - 1, 1)
+    rank = {rarity: i for i, rarity in enumerate(ranked)}
+    return [rarity_chance(rarity) * modifier ** (rank[rarity] / steps) for rarity in rarities]
+
+def rarity_distribution(rarities, modifier):
+    """Return {rarity: probability} for a total rarity modifier."""
+    weights = rarity_weights(rarities, modifier)
+    total = sum(weights)
+    return {rarity: weight / total for rarity, weight in zip(rarities, weights)}
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per draw."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("Alias table needs at least one positive weight")
+        scaled = [weight * n / total for weight in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            lesser = small.pop()
+            greater = large.pop()
+            self.prob[lesser] = scaled[lesser]
+            self.alias[lesser] = greater
+            scaled[greater] -= 1.0 - scaled[lesser]
+            (small if scaled[greater] < 1.0 else large).append(greater)
+        # Leftovers are 1.0 up to rounding error and keep prob 1.0
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+@lru_cache(maxsize=256)
+def get_rarity_sampler(rarities, modifier):
+    """Return a cached AliasTable over rarities (a tuple) for one modifier.
+
+    There is one table per distinct rod x bait x weather modifier.
+    """
+    return AliasTable(rarity_weights(rarities, modifier))
+
+def choose_rarity(rarities, modifier, rng=random):
+    """Draw a rarity from rarities (a tuple) in O(1) using the cached alias table."""
+    sampler = get_rarity_sampler(tuple(rarities), round(modifier, 6))
+    return rarities[sampler.sample(rng)]
 
 def rarity_chance(rarity):
     return {
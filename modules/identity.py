@@ -0,0 +1,86 @@
+import bisect
+import unicodedata
+
+MIN_PREFIX = 3  # shortest partial name !givemoney will complete
+
+def normalize_name(name):
+    """Fold a player name to the form used for lookups.
+
+    Applies NFKC (so fullwidth and other compatibility forms match their
+    plain letters), drops invisible format characters such as the
+    left-to-right mark CS2 appends to chat names, cuts a "﹫Workshop"-style
+    suffix, collapses whitespace and casefolds.
+    """
+    name = unicodedata.normalize("NFKC", name.split("﹫", 1)[0])
+    name = "".join(char for char in name if unicodedata.category(char) != "Cf")
+    return " ".join(name.split()).casefold()
+
+class IdentityRegistry:
+    """Maps normalized player names to player store keys.
+
+    names answers exact lookups with one hash of the normalized name;
+    ordered is the same names kept sorted, so every name starting with a
+    prefix sits in one contiguous run found by binary search. It is a
+    PlayerStore index: rebuilt on load and updated when a player is created
+    or renamed.
+    """
+
+    fields = frozenset(["original_username"])
+
+    def __init__(self):
+        self.names = {}
+        self.ordered = []
+
+    def rebuild(self, players):
+        self.names = {}
+        for username, record in players.items():
+            self.names.setdefault(normalize_name(record.get("original_username") or username), username)
+            self.names.setdefault(normalize_name(username), username)
+        self.ordered = sorted(self.names)
+
+    def affected_by(self, fields):
+        return fields is None or not self.fields.isdisjoint(fields)
+
+    def update(self, username, record):
+        for name in (record.get("original_username") or username, username):
+            normalized = normalize_name(name)
+            if normalized not in self.names:
+                self.names[normalized] = username
+                bisect.insort(self.ordered, normalized)
+
+    def resolve(self, name):
+        """Return the store key for an exact (normalized) name, or None."""
+        return self.names.get(normalize_name(name))
+
+    def complete(self, prefix, limit=4):
+        """Return up to limit distinct store keys whose names start with prefix."""
+        prefix = normalize_name(prefix)
+        matches = []
+        if not prefix:
+            return matches
+        index = bisect.bisect_left(self.ordered, prefix)
+        while index < len(self.ordered) and self.ordered[index].startswith(prefix):
+            username = self.names[self.ordered[index]]
+            if username not in matches:
+                matches.append(username)
+                if len(matches) >= limit:
+                    break
+            index += 1
+        return matches
+
+    def lookup(self, name):
+        """Resolve a name typed in chat: exact match, else a unique prefix.
+
+        Returns (store_key, candidates): store_key is None when nothing or
+        more than one player matches, and candidates lists the ambiguous
+        matches.
+        """
+        username = self.resolve(name)
+        if username is not None:
+            return username, []
+        if len(normalize_name(name)) < MIN_PREFIX:
+            return None, []
+        matches = self.complete(name)
+        if len(matches) == 1:
+            return matches[0], []
+        return None, matches
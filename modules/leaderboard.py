@@ -0,0 +1,63 @@
+import bisect
+import math
+
+class Leaderboard:
+    """Players ordered by one score, kept sorted as records change.
+
+    entries is a sorted list of (-score, username) so the best players come
+    first and ties break alphabetically; scores maps each username to its
+    current score so an update can find and move its old entry with a
+    binary search instead of re-sorting every player. fields names the
+    record fields the score depends on, so the store only reindexes a
+    player when one of them changes. Players whose score is not finite
+    (e.g. a NaN balance) are left out, since NaN breaks the ordering.
+    """
+
+    def __init__(self, score, fields):
+        self.score = score
+        self.fields = frozenset(fields)
+        self.entries = []
+        self.scores = {}
+
+    def rebuild(self, players):
+        self.scores = {}
+        for username, record in players.items():
+            score = self.score(record)
+            if math.isfinite(score):
+                self.scores[username] = score
+        self.entries = sorted((-score, username) for username, score in self.scores.items())
+
+    def affected_by(self, fields):
+        """Return True if a change to fields (None meaning the whole record) can move a player."""
+        return fields is None or not self.fields.isdisjoint(fields)
+
+    def update(self, username, record):
+        score = self.score(record)
+        old_score = self.scores.get(username)
+        if old_score == score:
+            return
+        if old_score is not None:
+            index = bisect.bisect_left(self.entries, (-old_score, username))
+            if index < len(self.entries) and self.entries[index] == (-old_score, username):
+                del self.entries[index]
+            del self.scores[username]
+        if not math.isfinite(score):
+            return
+        bisect.insort(self.entries, (-score, username))
+        self.scores[username] = score
+
+    def top(self, count):
+        """Return up to count (username, score) pairs with a positive score, best first."""
+        result = []
+        for negative_score, username in self.entries[:count]:
+            if negative_score >= 0:
+                break
+            result.append((username, -negative_score))
+        return result
+
+    def rank(self, username):
+        """Return username's 1-based position, or None if unknown."""
+        score = self.scores.get(username)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.entries, (-score, username)) + 1
@@ -0,0 +1,202 @@
+import time
+import bisect
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram upper bounds in seconds, from sub-millisecond parsing up to cast suspense
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Histograms that count something other than seconds get their own bounds
+HISTOGRAM_BUCKETS = {
+    "fishbot_output_batch_size": (1, 2, 3, 4, 6, 8, 12, 16),
+}
+
+# name -> help text; every metric the bot records is listed here
+HELP = {
+    "fishbot_parse_seconds": "Time to parse and cooldown-check one console line",
+    "fishbot_handler_seconds": "Time spent in a command handler",
+    "fishbot_storage_seconds": "Time spent in player/global stats storage I/O",
+    "fishbot_output_seconds": "Time to deliver one batch of chat output, including any keypress delay",
+    "fishbot_sleep_seconds": "Deliberate sleeps: cast suspense, keypress delay, rate limiting, coalescing and output backpressure",
+    "fishbot_lines_total": "Console lines read",
+    "fishbot_commands_total": "Commands run",
+    "fishbot_cooldown_rejections_total": "Commands rejected by a cooldown",
+    "fishbot_errors_total": "Errors raised by handlers or output delivery",
+    "fishbot_output_dropped_total": "Chat messages dropped from an output queue as stale or over OUTPUT_MAX_DEPTH",
+    "fishbot_output_merged_total": "Chat messages merged into an identical one already queued",
+    "fishbot_output_queue_depth": "Chat messages waiting in an output queue",
+    "fishbot_output_batch_size": "Chat messages delivered per flush (one exec write and keypress)",
+}
+GAUGES = frozenset(["fishbot_output_queue_depth"])  # read from a callback when rendered
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+class Metrics:
+    """Thread-safe registry of labelled histograms, counters and gauges.
+
+    Series are keyed by (name, labels) where labels is a sorted tuple of
+    (key, value) pairs, so observe("fishbot_handler_seconds", 0.01,
+    handler="gamble") and a later render() line up without any setup.
+    Gauges are callbacks, so a value such as a queue's depth costs nothing
+    until it is rendered.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(HISTOGRAM_BUCKETS.get(name, BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, read, **labels):
+        """Report read() as the value of gauge name, replacing any callback with the same labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = read
+
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def total(self, name):
+        """Return (count, sum, max) over every series of a histogram, or the sum of a counter or gauge."""
+        with self._lock:
+            if name in GAUGES:
+                return sum(read() for (series, _), read in self.gauges.items() if series == name)
+            if name in HELP and name.endswith("_total"):
+                return sum(value for (series, _), value in self.counters.items() if series == name)
+            histograms = [histogram for (series, _), histogram in self.histograms.items() if series == name]
+            return (
+                sum(histogram.count for histogram in histograms),
+                sum(histogram.sum for histogram in histograms),
+                max((histogram.max for histogram in histograms), default=0.0),
+            )
+
+    def render(self):
+        """Return every series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text in HELP.items():
+                if name in GAUGES:
+                    series = sorted((labels, read) for (series_name, labels), read in self.gauges.items() if series_name == name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} gauge")
+                    for labels, read in series:
+                        lines.append(f"{name}{_format_labels(labels)} {read()}")
+                    continue
+                if name.endswith("_total"):
+                    series = sorted((labels, value) for (series_name, labels), value in self.counters.items() if series_name == name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} counter")
+                    for labels, value in series:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                series = sorted((labels, histogram) for (series_name, labels), histogram in self.histograms.items() if series_name == name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Return a one-line summary for fish.log."""
+        parts = [
+            f"lines={self.total('fishbot_lines_total')}",
+            f"commands={self.total('fishbot_commands_total')}",
+            f"cooldown_rejections={self.total('fishbot_cooldown_rejections_total')}",
+            f"errors={self.total('fishbot_errors_total')}",
+            f"output_queued={self.total('fishbot_output_queue_depth')}",
+            f"output_dropped={self.total('fishbot_output_dropped_total')}",
+            f"output_merged={self.total('fishbot_output_merged_total')}",
+        ]
+        flushes, sent, largest = self.total("fishbot_output_batch_size")
+        parts.append(f"output_batches={flushes}x{sent / flushes if flushes else 0.0:.2f} messages (max {largest:g})")
+        for label, name in (("parse", "fishbot_parse_seconds"), ("handlers", "fishbot_handler_seconds"),
+                            ("storage", "fishbot_storage_seconds"), ("output", "fishbot_output_seconds"),
+                            ("sleep", "fishbot_sleep_seconds")):
+            count, total, longest = self.total(name)
+            average = total / count if count else 0.0
+            parts.append(f"{label}={count}x{average * 1e3:.3f}ms (total {total:.3f}s, max {longest * 1e3:.1f}ms)")
+        return "Metrics: " + ", ".join(parts)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+METRICS = Metrics()
+
+def timed(name, **labels):
+    """Decorator recording each call's duration in histogram name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.time(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics request from %s: %s", self.address_string(), format % args)
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics on host:port from a daemon thread; return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
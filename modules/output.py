@@ -0,0 +1,64 @@
+import sys
+import logging
+
+class OutputBackend:
+    """Delivers batches of console commands, e.g. "say ..." lines, somewhere."""
+
+    def deliver(self, commands):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ExecFileBackend(OutputBackend):
+    """The in-game path: write the commands into the exec cfg, then press the bound key."""
+
+    def __init__(self, write, press):
+        self.write = write
+        self.press = press
+
+    def deliver(self, commands):
+        self.write("\n".join(commands))
+        self.press()
+
+class CaptureBackend(OutputBackend):
+    """Keeps every delivered command in memory, for tests, replays and benchmarks."""
+
+    def __init__(self):
+        self.commands = []
+        self.deliveries = 0
+
+    def deliver(self, commands):
+        self.commands.extend(commands)
+        self.deliveries += 1
+
+class StdoutBackend(OutputBackend):
+    """Prints each command, one per line, after an optional prefix."""
+
+    def __init__(self, stream=None, prefix=""):
+        self.stream = stream or sys.stdout
+        self.prefix = prefix
+
+    def deliver(self, commands):
+        for command in commands:
+            print(self.prefix + command, file=self.stream)
+        self.stream.flush()
+
+class AppendFileBackend(OutputBackend):
+    """Appends each command as a line to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def deliver(self, commands):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            logging.info("Appending output to %s", self.path)
+        self._file.write("".join(command + "\n" for command in commands))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,44 @@
+import re
+import calendar
+import time
+from typing import NamedTuple, Optional
+
+# CS2 puts a left-to-right mark after every chat username
+NAME_MARK = "\u200e"
+
+# e.g. "10/18 21:04:05  [ALL] Bob‎﹫Workshop [DEAD]: !givemoney alice 100"
+CHAT_PATTERN = re.compile(
+    r"(?:(?P<timestamp>\d\d/\d\d \d\d:\d\d:\d\d)\s+)?"
+    r"\[(?:ALL|C?T?)\]\s+"
+    r"(?P<username>[^\u200e]+)\u200e"
+    r"(?:﹫\w+)?\s*(?:\[DEAD\])?:\s?"
+    r"(?P<command>!\S+)"
+    r"(?:[ \t]+(?P<args>[^\r\n]*?))?\s*$"
+)
+
+class ChatCommand(NamedTuple):
+    username: str
+    command: str
+    args: str
+    timestamp: Optional[str]  # "MM/DD HH:MM:SS" prefix written by -condebug, if present
+
+def parse_chat_line(line, commands):
+    """Return a ChatCommand for a chat line running one of commands, else None.
+
+    Lines without the chat name mark or a "!" are rejected by substring
+    checks before the anchored pattern is tried, so engine spam never
+    reaches the regex.
+    """
+    if NAME_MARK not in line or "!" not in line:
+        return None
+    match = CHAT_PATTERN.match(line)
+    if match is None:
+        return None
+    command = match.group("command")
+    if command not in commands:
+        return None
+    return ChatCommand(match.group("username"), command, match.group("args") or "", match.group("timestamp"))
+
+def log_time(timestamp, year=2000):
+    """Convert a "MM/DD HH:MM:SS" log timestamp to epoch seconds (UTC, in year)."""
+    return calendar.timegm(time.strptime(f"{year}/{timestamp}", "%Y/%m/%d %H:%M:%S"))
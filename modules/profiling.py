@@ -0,0 +1,104 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import logging
+import tracemalloc
+
+class Profiler:
+    """Profile the next N commands with cProfile and track memory growth with tracemalloc.
+
+    start() arms the profiler; every call() made while it is armed runs
+    under cProfile, and calls with count=True use up one of the N commands.
+    When the last one finishes (or stop() is called) the profile is written
+    to profile-<time>.prof with a readable profile-<time>.txt, and the
+    allocations made since start() to memory-<time>.txt, all in
+    output_dir. Nothing else about the running bot changes, so cooldowns
+    and the player store are untouched.
+    """
+
+    def __init__(self, output_dir, frames=10, top=30):
+        self.output_dir = output_dir
+        self.frames = frames
+        self.top = top
+        self.remaining = 0
+        self._profile = None
+        self._baseline = None
+        self._started_tracemalloc = False
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def start(self, commands):
+        """Profile the next commands commands; return False if already profiling."""
+        if self.active:
+            return False
+        self.remaining = max(1, commands)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        self._baseline = tracemalloc.take_snapshot()
+        self._profile = cProfile.Profile()
+        logging.info("Profiling the next %s commands", self.remaining)
+        return True
+
+    def call(self, func, *args, count=False):
+        """Run func(*args), under cProfile while profiling."""
+        if self._profile is None:
+            return func(*args)
+        try:
+            return self._profile.runcall(func, *args)
+        finally:
+            if count:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.stop()
+
+    def stop(self):
+        """Write the reports and disarm; return the written paths, or [] if not profiling."""
+        if self._profile is None:
+            return []
+        profile, self._profile = self._profile, None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        prof_file = os.path.join(self.output_dir, f"profile-{stamp}.prof")
+        text_file = os.path.join(self.output_dir, f"profile-{stamp}.txt")
+        memory_file = os.path.join(self.output_dir, f"memory-{stamp}.txt")
+        try:
+            profile.dump_stats(prof_file)
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(self.top)
+            with open(text_file, "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+            with open(memory_file, "w", encoding="utf-8") as f:
+                f.write(self._memory_report())
+        except IOError as e:
+            logging.error("Failed to write profile reports to %s: %s", self.output_dir, e)
+            return []
+        finally:
+            self._baseline = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        logging.info("Wrote %s, %s and %s", prof_file, text_file, memory_file)
+        return [prof_file, text_file, memory_file]
+
+    def _memory_report(self):
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: current {current / 1024:,.1f} KiB, peak {peak / 1024:,.1f} KiB", ""]
+        lines.append(f"Top {self.top} allocation growth since profiling started:")
+        for stat in snapshot.compare_to(self._baseline.filter_traces(filters), "lineno")[:self.top]:
+            lines.append(f"  {stat}")
+        lines.append("")
+        lines.append(f"Top {self.top} live allocations:")
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            lines.append(f"  {stat}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,145 @@
+"""Monte Carlo economy simulator for rods, baits and gambling.
+
+Reuses the live tables from modules.fish (rods, baits, rarity weights,
+weather modifiers) and fishbase.json, but draws casts in NumPy batches
+instead of calling begin_cast, which waits out the cast and sends chat.
+
+Usage: python -m modules.simulate [--casts N] [--sessions N] ...
+Requires numpy (pip install numpy); it is not needed to run the bot.
+"""
+import argparse
+import json
+import os
+import time
+from modules.fish import (
+    FISHING_RODS, FISHING_BAITS, BASE_WEATHER, WEATHER_CHANGE_CHANCE, FishCatalog,
+    SeaWeatherCondition, TimeOfDay, get_rarity_modifier, rarity_distribution
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_FISHBASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fishbase.json")
+FISH_COOLDOWN = 6.0  # seconds between !fish commands for one player
+
+class EconomySimulator:
+    """Vectorized model of begin_cast and gamble."""
+
+    def __init__(self, catalog, seed=None):
+        if np is None:
+            raise ImportError("The economy simulator needs numpy: pip install numpy")
+        self.rng = np.random.default_rng(seed)
+        self.rarities = catalog.rarities
+        self.weathers = list(SeaWeatherCondition)
+        self.weather_modifiers = np.array([get_rarity_modifier(weather) for weather in self.weathers])
+        # Probability of each weather when the time of day is uniform
+        weather_probs = np.full(len(self.weathers), WEATHER_CHANGE_CHANCE / len(self.weathers))
+        for time_of_day in TimeOfDay:
+            weather_probs[self.weathers.index(BASE_WEATHER[time_of_day])] += (1 - WEATHER_CHANGE_CHANCE) / len(TimeOfDay)
+        self.weather_cdf = np.cumsum(weather_probs)
+        # Flat fish arrays with per-rarity offsets so one draw picks the fish
+        prices, min_weights, max_weights, offsets, counts = [], [], [], [], []
+        for rarity in self.rarities:
+            fish_list = catalog.fish_by_rarity[rarity]
+            offsets.append(len(prices))
+            counts.append(len(fish_list))
+            for fish in fish_list:
+                prices.append(fish["Price"])
+                min_weights.append(fish["Weight"]["Min"])
+                max_weights.append(fish["Weight"]["Max"])
+        self.prices = np.array(prices)
+        self.min_weights = np.array(min_weights)
+        self.max_weights = np.array(max_weights)
+        self.offsets = np.array(offsets)
+        self.counts = np.array(counts)
+
+    def cast_values(self, rod, bait, size):
+        """Return the money earned by size casts with rod and bait (0 for a miss)."""
+        rod_stats = FISHING_RODS[rod]
+        bait_stats = FISHING_BAITS[bait]
+        catch_rate = min(1.0, rod_stats["catch_rate"] + bait_stats["catch_rate_boost"])
+        gear_modifier = rod_stats["rarity_modifier"] * bait_stats["rarity_modifier"]
+        rarity_cdfs = np.array([
+            np.cumsum(list(rarity_distribution(self.rarities, gear_modifier * weather_modifier).values()))
+            for weather_modifier in self.weather_modifiers
+        ])
+        rng = self.rng
+        weather = np.minimum(np.searchsorted(self.weather_cdf, rng.random(size), side="right"), len(self.weathers) - 1)
+        rarity = (rng.random(size)[:, None] > rarity_cdfs[weather]).sum(axis=1)
+        rarity = np.minimum(rarity, len(self.rarities) - 1)
+        fish = self.offsets[rarity] + (rng.random(size) * self.counts[rarity]).astype(np.int64)
+        weight = rng.uniform(self.min_weights[fish], self.max_weights[fish])
+        caught = rng.random(size) <= catch_rate
+        return np.where(caught, self.prices[fish] * weight, 0.0)
+
+    def gamble(self, balances, fraction):
+        """Apply one !gamble of fraction * balance to every balance (50% to double the stake)."""
+        stakes = balances * fraction
+        wins = self.rng.random(balances.shape) < 0.5
+        return balances + np.where(wins, stakes, -stakes)
+
+    def expected_income(self, casts):
+        """Return {(rod, bait): (mean, std) income per cast}."""
+        results = {}
+        for rod in FISHING_RODS:
+            for bait in FISHING_BAITS:
+                values = self.cast_values(rod, bait, casts)
+                results[(rod, bait)] = (float(values.mean()), float(values.std()))
+        return results
+
+    def time_to_afford(self, income, rod="Old Rod", bait="Worm"):
+        """Return {item: expected casts} to afford each shop item from zero with rod and bait."""
+        mean = income[(rod, bait)][0]
+        items = {**FISHING_RODS, **FISHING_BAITS}
+        return {item: stats["price"] / mean for item, stats in items.items() if stats["price"] > 0}
+
+    def balance_distribution(self, players, sessions, casts_per_session, gamble_fraction, rod="Old Rod", bait="Worm"):
+        """Simulate players fishing for sessions, gambling gamble_fraction of their balance after each one."""
+        balances = np.zeros(players)
+        for _ in range(sessions):
+            balances += self.cast_values(rod, bait, players * casts_per_session).reshape(players, casts_per_session).sum(axis=1)
+            if gamble_fraction > 0:
+                balances = self.gamble(balances, gamble_fraction)
+        return balances
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Monte Carlo simulation of the fishing economy")
+    arg_parser.add_argument("--fishbase", default=DEFAULT_FISHBASE, help="path to fishbase.json")
+    arg_parser.add_argument("--casts", type=int, default=1_000_000, help="casts simulated per rod/bait combo")
+    arg_parser.add_argument("--players", type=int, default=10_000, help="players in the balance distribution")
+    arg_parser.add_argument("--sessions", type=int, default=20, help="sessions per player")
+    arg_parser.add_argument("--session-casts", type=int, default=50, help="!fish casts per session")
+    arg_parser.add_argument("--gamble-fraction", type=float, default=0.0, help="share of balance gambled after each session")
+    arg_parser.add_argument("--seed", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    with open(args.fishbase, "r") as file:
+        simulator = EconomySimulator(FishCatalog(json.load(file)), seed=args.seed)
+
+    start = time.perf_counter()
+    income = simulator.expected_income(args.casts)
+    elapsed = time.perf_counter() - start
+    total_casts = args.casts * len(income)
+    print(f"Expected income per cast ({total_casts:,} casts in {elapsed:.2f}s, {total_casts / elapsed:,.0f} casts/s)")
+    for (rod, bait), (mean, std) in sorted(income.items(), key=lambda item: item[1][0]):
+        print(f"  {rod:<12} + {bait:<7} ${mean:>9,.2f}  (sd ${std:,.2f})")
+
+    print("Time to afford with Old Rod + Worm")
+    for item, casts in sorted(simulator.time_to_afford(income).items(), key=lambda item: item[1]):
+        print(f"  {item:<12} {casts:>9,.0f} casts  ~{casts * FISH_COOLDOWN / 60:,.1f} min at the !fish cooldown")
+
+    start = time.perf_counter()
+    stakes = simulator.gamble(np.ones(args.casts), 1.0)
+    elapsed = time.perf_counter() - start
+    print(f"Gamble: {args.casts / elapsed:,.0f} calls/s, mean return {stakes.mean():.4f}x")
+
+    balances = simulator.balance_distribution(args.players, args.sessions, args.session_casts, args.gamble_fraction)
+    percentiles = np.percentile(balances, [10, 50, 90, 99])
+    print(f"Balance after {args.sessions} sessions of {args.session_casts} casts (gambling {args.gamble_fraction:.0%} after each), {args.players:,} players")
+    print(f"  mean ${balances.mean():,.2f}  p10 ${percentiles[0]:,.2f}  p50 ${percentiles[1]:,.2f}  "
+          f"p90 ${percentiles[2]:,.2f}  p99 ${percentiles[3]:,.2f}  broke {np.mean(balances <= 0):.1%}")
+
+if __name__ == "__main__":
+    main()
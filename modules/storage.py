@@ -0,0 +1,372 @@
+import json
+import os
+import sqlite3
+import logging
+import contextlib
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+PLAYER_COLUMNS = ["original_username", "balance", "total_casts", "total_fish_caught", "equipped_rod", "equipped_bait", "rarities"]
+
+class FileLock:
+    """Exclusive advisory lock on a lock file: flock on POSIX, msvcrt.locking on Windows.
+
+    Reentrant within one process, so nested read-modify-write sections only
+    take the OS lock once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            if self._file is None:
+                self._file = open(self.path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        return False
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class LedgerBackend:
+    """Player stats persisted as a JSON snapshot plus an append-only ledger.
+
+    Every mutation appends one line of the form
+    {"op": "<kind>", "v": <version>, "p": {"<player>": {"<field>": <new value>, ...}}}
+    to the ledger. Records carry absolute values rather than deltas, so
+    replaying a record that is already part of the snapshot is harmless.
+    compact() folds the ledger into a fresh snapshot, truncates it and
+    starts it with a {"op": "snapshot"} marker holding the version the
+    snapshot was taken at; every later record bumps the version by one.
+
+    With shared=True several processes may use the same files: callers take
+    lock() around each read-modify-write, call changes_since() to pick up
+    records other processes appended (or learn that one of them compacted),
+    and every append reaches the file before the lock is released.
+    """
+
+    def __init__(self, snapshot_path, ledger_path, global_path, shared=False):
+        self.path = snapshot_path
+        self.snapshot_path = snapshot_path
+        self.ledger_path = ledger_path
+        self.global_path = global_path
+        self.shared = shared
+        self.records = 0
+        self.version = 0
+        self._base = 0  # version in the marker at the top of the ledger
+        self._offset = 0  # ledger bytes already seen by this process
+        self._ledger = None
+        self._lock = FileLock(ledger_path + ".lock") if shared else None
+
+    def lock(self):
+        """Return a context manager holding the cross-process lock (a no-op unless shared)."""
+        return self._lock if self._lock is not None else contextlib.nullcontext()
+
+    def load(self):
+        """Return the snapshot with every ledger record replayed on top."""
+        with self.lock():
+            players = {}
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as file:
+                    players = json.load(file)
+            self.records = self._replay(players)
+            return players
+
+    def _replay(self, players):
+        self._base = self.version = self._offset = 0
+        if not os.path.exists(self.ledger_path):
+            return 0
+        records = 0
+        good_offset = 0
+        with open(self.ledger_path, "rb") as file:
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    logging.warning("Ignoring torn record at end of %s", self.ledger_path)
+                    break
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    logging.warning("Ignoring corrupt record at offset %s in %s", good_offset, self.ledger_path)
+                    break
+                if record["op"] == "snapshot":
+                    self._base = record["v"]
+                else:
+                    apply_patch(players, record["p"])
+                    records += 1
+                self.version = record.get("v", self.version + 1)
+                good_offset += len(raw)
+        if good_offset != os.path.getsize(self.ledger_path):
+            # Drop the partial tail so new appends start on a clean line
+            with open(self.ledger_path, "r+b") as file:
+                file.truncate(good_offset)
+        self._offset = good_offset
+        logging.info("Replayed %s ledger records from %s", records, self.ledger_path)
+        return records
+
+    def changes_since(self):
+        """Return patches other processes appended since we last read or wrote, or None if the ledger was compacted under us.
+
+        Call with lock() held.
+        """
+        if not os.path.exists(self.ledger_path):
+            return None if self._offset else []
+        with open(self.ledger_path, "rb") as file:
+            first = file.readline()
+            base = 0
+            if first.endswith(b"\n"):
+                record = json.loads(first)
+                base = record["v"] if record["op"] == "snapshot" else 0
+            size = os.fstat(file.fileno()).st_size
+            if base != self._base or size < self._offset:
+                return None
+            if size == self._offset:
+                return []
+            file.seek(self._offset)
+            patches = []
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    break
+                record = json.loads(raw)
+                patches.append(record["p"])
+                self.version = record["v"]
+                self._offset += len(raw)
+                self.records += 1
+        logging.debug("Picked up %s ledger records written by another process", len(patches))
+        return patches
+
+    def append(self, op, patch):
+        """Append one record; it reaches the OS on the next flush(), or at once when shared."""
+        if self._ledger is None:
+            self._ledger = open(self.ledger_path, "a", encoding="utf-8")
+        self.version += 1
+        self._ledger.write(json.dumps({"op": op, "v": self.version, "p": patch}, separators=(",", ":")) + "\n")
+        self.records += 1
+        if self.shared:
+            self._ledger.flush()
+            self._offset = os.fstat(self._ledger.fileno()).st_size
+
+    def flush(self):
+        if self._ledger is not None:
+            self._ledger.flush()
+
+    def compact(self, players):
+        """Write players as the new snapshot and empty the ledger."""
+        self.flush()
+        data = json.dumps(players, indent=2)  # Raises TypeError if non-serializable
+        tmp_file = f"{self.snapshot_path}.{os.getpid()}.tmp"  # per process, as unlocked writers may overlap
+        with open(tmp_file, "w") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.snapshot_path)
+        # Only truncate once the snapshot is durable; a crash in between replays
+        # records that are already in the snapshot, which is idempotent.
+        if self._ledger is not None:
+            self._ledger.close()
+            self._ledger = None
+        with open(self.ledger_path, "w", encoding="utf-8") as ledger:
+            ledger.write(json.dumps({"op": "snapshot", "v": self.version, "p": {}}, separators=(",", ":")) + "\n")
+        self._base = self.version
+        self._offset = os.path.getsize(self.ledger_path)
+        logging.info("Compacted %s ledger records into %s", self.records, self.snapshot_path)
+        self.records = 0
+
+    def close(self):
+        if self._ledger is not None:
+            self._ledger.close()
+            self._ledger = None
+        if self._lock is not None:
+            self._lock.close()
+
+    def load_global(self):
+        """Return global stats (with their "version" counter), or None if none have been saved yet."""
+        if not os.path.exists(self.global_path):
+            return None
+        with open(self.global_path, "r") as file:
+            return json.load(file)
+
+    def save_global(self, stats):
+        data = json.dumps(stats, indent=2)
+        tmp_file = f"{self.global_path}.{os.getpid()}.tmp"  # per process, as shared writers may overlap
+        with open(tmp_file, "w") as file:
+            file.write(data)
+        os.replace(tmp_file, self.global_path)
+
+class SqliteBackend:
+    """Player and global stats in a SQLite database in WAL mode.
+
+    Each player is one row keyed by lowercase username, so a ledger-style
+    append becomes an UPDATE of only the touched rows and columns. Appends
+    share a transaction that is committed on flush().
+    """
+
+    def __init__(self, db_path):
+        self.path = db_path
+        self.shared = False  # SQLite does its own locking
+        self.records = 0  # never needs compaction
+        self._conn = None
+
+    def lock(self):
+        return contextlib.nullcontext()
+
+    def changes_since(self):
+        return []
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS players ("
+                "username TEXT PRIMARY KEY, original_username TEXT, balance REAL NOT NULL DEFAULT 0, "
+                "total_casts INTEGER NOT NULL DEFAULT 0, total_fish_caught INTEGER NOT NULL DEFAULT 0, "
+                "equipped_rod TEXT, equipped_bait TEXT, rarities TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS players_balance ON players (balance)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS global_stats (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def load(self):
+        players = {}
+        rows = self._connection().execute(f"SELECT username, {', '.join(PLAYER_COLUMNS)} FROM players")
+        for row in rows:
+            record = dict(zip(PLAYER_COLUMNS, row[1:]))
+            record["rarities"] = json.loads(record["rarities"]) if record["rarities"] else {}
+            players[row[0]] = {key: value for key, value in record.items() if value is not None}
+        logging.info("Loaded %s players from %s", len(players), self.path)
+        return players
+
+    def append(self, op, patch):
+        conn = self._connection()
+        for player, fields in patch.items():
+            columns = [column for column in PLAYER_COLUMNS if column in fields]
+            values = [_column_value(column, fields[column]) for column in columns]
+            if len(columns) == len(PLAYER_COLUMNS):
+                conn.execute(
+                    f"INSERT OR REPLACE INTO players (username, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+                    [player] + values
+                )
+            elif columns:
+                conn.execute(
+                    f"UPDATE players SET {', '.join(f'{column} = ?' for column in columns)} WHERE username = ?",
+                    values + [player]
+                )
+
+    def flush(self):
+        if self._conn is not None and self._conn.in_transaction:
+            self._conn.commit()
+
+    def compact(self, players):
+        """Rewrite every player row in one transaction."""
+        conn = self._connection()
+        conn.execute("DELETE FROM players")
+        conn.executemany(
+            f"INSERT INTO players (username, {', '.join(PLAYER_COLUMNS)}) VALUES (?{', ?' * len(PLAYER_COLUMNS)})",
+            [[player] + [_column_value(column, record.get(column)) for column in PLAYER_COLUMNS] for player, record in players.items()]
+        )
+        conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def load_global(self):
+        row = self._connection().execute("SELECT data FROM global_stats WHERE id = 1").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_global(self, stats):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO global_stats (id, data) VALUES (1, ?)", (json.dumps(stats),))
+        conn.commit()
+
+class MemoryBackend:
+    """Keeps player and global stats in memory only; used by replay runs."""
+
+    def __init__(self):
+        self.path = ":memory:"
+        self.shared = False
+        self.records = 0
+        self._global = None
+
+    def lock(self):
+        return contextlib.nullcontext()
+
+    def changes_since(self):
+        return []
+
+    def load(self):
+        return {}
+
+    def append(self, op, patch):
+        pass
+
+    def flush(self):
+        pass
+
+    def compact(self, players):
+        pass
+
+    def close(self):
+        pass
+
+    def load_global(self):
+        return self._global
+
+    def save_global(self, stats):
+        self._global = stats
+
+def _column_value(column, value):
+    if column == "rarities":
+        return json.dumps(value)
+    return value
+
+def import_json(snapshot_path, ledger_path, global_path, db_path):
+    """Copy player_stats.json (plus any ledger) and global_stats.json into a SQLite database."""
+    source = LedgerBackend(snapshot_path, ledger_path, global_path)
+    players = {player.lower(): record for player, record in source.load().items()}
+    target = SqliteBackend(db_path)
+    target.compact(players)
+    global_stats = source.load_global()
+    if global_stats is not None:
+        target.save_global(global_stats)
+    target.close()
+    logging.info("Imported %s players into %s", len(players), db_path)
+    return len(players)
+
+def apply_patch(players, patch):
+    """Apply a ledger patch of {player: {field: value}} to players in place."""
+    for player, fields in patch.items():
+        record = players.get(player)
+        if record is None:
+            players[player] = dict(fields)
+        else:
+            record.update(fields)
@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import json
+import errno
+import select
+import hashlib
+import ctypes
+import ctypes.util
+import logging
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+READ_CHUNK = 1 << 16
+HEAD_BYTES = 4096  # bytes hashed to recognise the same log across restarts
+
+class _Inotify:
+    """Minimal ctypes wrapper around Linux inotify."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = []
+
+    def watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._watches.append(wd)
+
+    def wait(self, timeout):
+        """Block until an event arrives or timeout passes; return True on events."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # Drain the queue; callers re-check the file rather than decode events
+        while True:
+            try:
+                if not os.read(self.fd, 4096):
+                    break
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class LogTailer:
+    """Follow an append-only log such as console.log and yield complete lines.
+
+    New bytes are read in bulk and split into lines; a trailing partial
+    line is held back until its newline arrives. On Linux the tailer sleeps
+    on inotify events for the log's directory; elsewhere (or if
+    inotify is unavailable) it polls every poll_interval seconds.
+    Truncation (size drops below our offset) restarts from the top, and
+    replacement (a new inode at the same path, e.g. rotation) finishes the
+    old file before switching to the new one.
+
+    With a cursor_path, open() resumes from the offset saved by
+    save_cursor() if the log is still the same file (inode, size and a
+    hash of its first HEAD_BYTES bytes), skipping the lines past it whose
+    start offsets the cursor lists under "done" (already handled while an
+    earlier one was not). A truncated or replaced log is read from the top
+    instead. Either way at most catchup_bytes of backlog are read;
+    backlog_end is the log size at open, so callers can tell catch-up
+    lines from live ones.
+    """
+
+    def __init__(self, path, poll_interval=0.1, idle_timeout=1.0, use_inotify=True, cursor_path=None, catchup_bytes=1 << 20):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.cursor_path = cursor_path
+        self.catchup_bytes = catchup_bytes
+        self.backlog_end = None
+        self._file = None
+        self._partial = b""
+        self._head = None
+        self._done = set()
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                # Watch the directory so writes to a recreated log are still seen
+                self._inotify.watch(os.path.dirname(os.path.abspath(path)), IN_MODIFY | IN_ATTRIB | IN_CREATE | IN_MOVED_TO)
+                logging.info("Tailing %s with inotify", path)
+            except (OSError, AttributeError) as e:
+                logging.warning("inotify unavailable (%s), polling %s every %ss", e, path, poll_interval)
+                self._inotify = None
+        else:
+            logging.info("Polling %s every %ss", path, poll_interval)
+
+    def open(self, from_end=True):
+        self._file = open(self.path, "rb")
+        self._partial = b""
+        self._head = self._hash_head()
+        self._done = set()
+        self.backlog_end = None
+        if from_end and self.cursor_path:
+            self._resume()
+        elif from_end:
+            self._file.seek(0, os.SEEK_END)
+
+    def _hash_head(self):
+        position = self._file.tell()
+        self._file.seek(0, os.SEEK_SET)
+        head = self._file.read(HEAD_BYTES)
+        self._file.seek(position, os.SEEK_SET)
+        return len(head), hashlib.sha256(head).hexdigest()
+
+    def _resume(self):
+        size = os.fstat(self._file.fileno()).st_size
+        cursor = load_cursor(self.cursor_path)
+        if cursor is None:
+            logging.info("No read cursor at %s, starting at the end of %s", self.cursor_path, self.path)
+            self._file.seek(0, os.SEEK_END)
+            return
+        opened = os.fstat(self._file.fileno())
+        head_length, head_hash = cursor["head"]
+        same_file = (
+            (cursor["ino"], cursor["dev"]) == (opened.st_ino, opened.st_dev)
+            and self._head[0] >= head_length
+            and self._hash_prefix(head_length) == head_hash
+        )
+        if not same_file:
+            start = 0
+            logging.info("%s was replaced since the last run, catching up from the start", self.path)
+        elif size < cursor["offset"]:
+            start = 0
+            logging.info("%s was truncated since the last run, catching up from the start", self.path)
+        else:
+            start = cursor["offset"]
+            self._done = set(cursor["done"])
+        if size - start > self.catchup_bytes:
+            logging.warning("Skipping %d bytes of %s backlog beyond %d", size - start - self.catchup_bytes, self.path, self.catchup_bytes)
+            start = size - self.catchup_bytes
+            self._file.seek(start, os.SEEK_SET)
+            self._file.readline()  # drop the line we landed in the middle of
+        else:
+            self._file.seek(start, os.SEEK_SET)
+        self.backlog_end = size
+        logging.info("Resuming %s at byte %d with %d bytes of backlog", self.path, self._file.tell(), size - self._file.tell())
+
+    def _hash_prefix(self, length):
+        position = self._file.tell()
+        self._file.seek(0, os.SEEK_SET)
+        digest = hashlib.sha256(self._file.read(length)).hexdigest()
+        self._file.seek(position, os.SEEK_SET)
+        return digest
+
+    def cursor(self):
+        """Return the checkpoint for everything returned so far, for save_cursor()."""
+        if self._head[0] < HEAD_BYTES and self._file.tell() > self._head[0]:
+            self._head = self._hash_head()  # the log was shorter than HEAD_BYTES when first hashed
+        opened = os.fstat(self._file.fileno())
+        return {
+            "offset": self._file.tell() - len(self._partial),
+            "ino": opened.st_ino,
+            "dev": opened.st_dev,
+            "head": list(self._head),
+        }
+
+    def save_cursor(self, cursor):
+        """Write a checkpoint taken by cursor() to cursor_path."""
+        if not self.cursor_path:
+            return
+        try:
+            tmp_file = self.cursor_path + ".tmp"
+            with open(tmp_file, "w") as file:
+                json.dump(cursor, file)
+            os.replace(tmp_file, self.cursor_path)
+        except IOError as e:
+            logging.error("Failed to save read cursor to %s: %s", self.cursor_path, e)
+
+    def read_lines_with_offsets(self):
+        """Return (lines, starts): every complete line appended since the last call, and the offset each starts at.
+
+        Lines left over from a replaced file count as starting at offset 0
+        of the new one.
+        """
+        lines = self._check_rotation()
+        starts = [0] * len(lines)
+        offset = self._file.tell() - len(self._partial)
+        chunks = []
+        while True:
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        if chunks:
+            *new_lines, self._partial = (self._partial + b"".join(chunks)).split(b"\n")
+            for line in new_lines:
+                if offset in self._done:
+                    self._done.discard(offset)
+                    logging.debug("Skipping line at byte %d of %s, handled before the restart", offset, self.path)
+                else:
+                    lines.append(line)
+                    starts.append(offset)
+                offset += len(line) + 1
+        return [line.rstrip(b"\r").decode("utf-8", errors="replace") + "\n" for line in lines], starts
+
+    def _check_rotation(self):
+        """Handle truncation or replacement; return leftover lines from a replaced file."""
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return []  # rotated away and not yet recreated; keep reading the old file
+        opened = os.fstat(self._file.fileno())
+        if (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+            # Finish what was appended to the old file before it was replaced
+            rest = (self._partial + self._file.read()).split(b"\n")
+            if not rest[-1]:
+                rest.pop()
+            logging.info("%s was replaced, reopening", self.path)
+            self._file.close()
+            self.open(from_end=False)
+            return rest
+        if current.st_size < self._file.tell():
+            logging.info("%s was truncated, reading from the start", self.path)
+            self._file.seek(0, os.SEEK_SET)
+            self._partial = b""
+            self._done = set()
+        return []
+
+    def wait(self):
+        """Sleep until the log may have changed."""
+        if self._inotify is not None:
+            self._inotify.wait(self.idle_timeout)
+        else:
+            time.sleep(self.poll_interval)
+
+    def follow_batches(self, on_idle=None):
+        """Yield (lines, starts, cursor) for each batch of new lines.
+
+        cursor is the checkpoint after the whole batch and starts[i] the
+        offset lines[i] starts at in the same file, so a caller still working
+        on lines[i] can save dict(cursor, offset=starts[i]) instead.
+        """
+        if self._file is None:
+            self.open()
+        while True:
+            lines, starts = self.read_lines_with_offsets()
+            if not lines:
+                if on_idle:
+                    on_idle()
+                self.wait()
+                continue
+            yield lines, starts, self.cursor()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+def load_cursor(path):
+    """Return the checkpoint saved at path, or None if missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as file:
+            cursor = json.load(file)
+        return {"offset": int(cursor["offset"]), "ino": cursor["ino"], "dev": cursor["dev"], "head": cursor["head"],
+                "done": [int(start) for start in cursor.get("done", [])]}
+    except (IOError, ValueError, KeyError, TypeError) as e:
+        logging.error("Ignoring unreadable read cursor %s: %s", path, e)
+        return None
@@ -1,325 +1,912 @@
-import time
-import pyautogui
-import os
-import json
-import sys
-from dotenv import load_dotenv
-import logging
-import tkinter as tk
-from tkinter import messagebox
-
-# Determine base path for files (bundled or local)
-def get_base_path():
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)  # .exe directory
-    # Use main.py's directory for non-bundled runs
-    return os.path.dirname(os.path.abspath(sys.modules['__main__'].__file__))
-
-BASE_PATH = get_base_path()
-
-# Configure logging
-def setup_logging():
-    log_file = os.path.join(BASE_PATH, 'fish.log')
-    if not os.path.exists(log_file):
-        try:
-            with open(log_file, 'w') as f:
-                f.write('')
-            logging.debug(f"Created fish.log at {log_file}")
-        except IOError as e:
-            root = tk.Tk()
-            root.withdraw()
-            messagebox.showerror("Error", f"Failed to create log file: {log_file}\n{str(e)}")
-            root.destroy()
-            sys.exit(1)
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    logging.debug("Logging initialized")
-    logging.debug(f"BASE_PATH set to: {BASE_PATH}")
-
-# Load environment variables
-load_dotenv(os.path.join(BASE_PATH, '.env'))
-
-# Default paths if not set in .env
-EXEC_FILE = os.getenv('EXEC_FILE', os.path.join(BASE_PATH, 'exec.txt'))
-CONSOLE_FILE = os.getenv('CONSOLE_FILE', os.path.join(BASE_PATH, 'console.log'))
-if not EXEC_FILE or not CONSOLE_FILE:
-    logging.warning("EXEC_FILE or CONSOLE_FILE not set in .env, using defaults")
-
-PLAYER_STATS_FILE = os.path.join(BASE_PATH, 'player_stats.json')
-GLOBAL_STATS_FILE = os.path.join(BASE_PATH, 'global_stats.json')
-FISHBASE_FILE = os.path.join(BASE_PATH, 'fishbase.json')
-
-def load_balances():
-    """Load balances from player_stats.json, return a dict with lowercase keys."""
-    stats = load_player_stats()
-    balances = {player: data.get("balance", 0.0) for player, data in stats.items()}
-    logging.debug(f"Loaded balances: {balances}")
-    return balances
-
-def save_balances(username, balance):
-    """Save a single user's balance to player_stats.json."""
-    username_lower = username.lower()
-    stats = load_player_stats()
-    logging.debug(f"Before saving balance for {username_lower}: {stats.get(username_lower, {})}")
-    if username_lower in stats:
-        stats[username_lower]["balance"] = float(balance)  # Ensure balance is float
-    else:
-        stats[username_lower] = {
-            "balance": float(balance),
-            "total_casts": 0,
-            "total_fish_caught": 0,
-            "rarities": {
-                "Common": 0,
-                "Uncommon": 0,
-                "Rare": 0,
-                "Very Rare": 0,
-                "Epic": 0,
-                "Legendary": 0
-            },
-            "equipped_rod": "Old Rod",
-            "equipped_bait": "Worm",
-            "original_username": username
-        }
-    logging.debug(f"After setting balance for {username_lower}: {stats[username_lower]}")
-    save_player_stats(stats)
-    logging.info(f"Saved balance for {username_lower}: {balance}")
-
-def get_balance(username):
-    """Get a user's balance from player_stats.json, initialize to 0 if not found."""
-    username_lower = username.lower()
-    balances = load_balances()
-    balance = balances.get(username_lower, 0.0)
-    logging.debug(f"Retrieved balance for {username_lower}: {balance}")
-    return balance
-
-def update_balance(username, amount):
-    """Update a user's balance in player_stats.json and return the new balance."""
-    username_lower = username.lower()
-    current_balance = get_balance(username_lower)
-    new_balance = current_balance + float(amount)  # Ensure amount is float
-    logging.debug(f"Updating balance for {username_lower}: {current_balance} + {amount} = {new_balance}")
-    save_balances(username_lower, new_balance)
-    return new_balance
-
-def load_player_stats():
-    """Load player stats from player_stats.json, create file if it doesn't exist."""
-    logging.debug(f"Attempting to load player_stats from: {PLAYER_STATS_FILE}")
-    if not os.path.exists(PLAYER_STATS_FILE):
-        logging.info(f"player_stats.json not found, creating at {PLAYER_STATS_FILE}")
-        try:
-            with open(PLAYER_STATS_FILE, 'w') as file:
-                json.dump({}, file)
-            logging.debug(f"Created empty player_stats.json")
-        except IOError as e:
-            logging.error(f"Failed to create player_stats.json: {str(e)}")
-            root = tk.Tk()
-            root.withdraw()
-            messagebox.showerror("Error", f"Failed to create player stats file: {PLAYER_STATS_FILE}\n{str(e)}")
-            root.destroy()
-            sys.exit(1)
-    try:
-        with open(PLAYER_STATS_FILE, "r") as file:
-            stats = json.load(file)
-            default_player_stats = {
-                "balance": 0.0,
-                "total_casts": 0,
-                "total_fish_caught": 0,
-                "rarities": {
-                    "Common": 0,
-                    "Uncommon": 0,
-                    "Rare": 0,
-                    "Very Rare": 0,
-                    "Epic": 0,
-                    "Legendary": 0
-                },
-                "equipped_rod": "Old Rod",
-                "equipped_bait": "Worm",
-                "original_username": ""
-            }
-            new_stats = {}
-            for player, data in stats.items():
-                player_lower = player.lower()
-                if "original_username" not in data:
-                    data["original_username"] = player
-                if "equipped_bait" not in data:
-                    data["equipped_bait"] = "Worm"
-                if "balance" not in data:
-                    data["balance"] = 0.0
-                for key in default_player_stats:
-                    if key not in data:
-                        data[key] = default_player_stats[key]
-                for rarity in default_player_stats["rarities"]:
-                    if rarity not in data["rarities"]:
-                        data["rarities"][rarity] = 0
-                new_stats[player_lower] = data
-            logging.debug(f"Loaded player stats: {new_stats}")
-            return new_stats
-    except (json.JSONDecodeError, IOError) as e:
-        logging.error(f"Error reading player stats file: {PLAYER_STATS_FILE}\n{str(e)}")
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Error", f"Error reading player stats file: {PLAYER_STATS_FILE}\n{str(e)}")
-        root.destroy()
-        sys.exit(1)
-
-def save_player_stats(stats):
-    """Save player stats to player_stats.json, preserving lowercase keys."""
-    logging.debug(f"Attempting to save player_stats to: {PLAYER_STATS_FILE}")
-    try:
-        # Check if file is writable
-        if os.path.exists(PLAYER_STATS_FILE):
-            if not os.access(PLAYER_STATS_FILE, os.W_OK):
-                logging.error(f"Player stats file is not writable: {PLAYER_STATS_FILE}")
-                root = tk.Tk()
-                root.withdraw()
-                messagebox.showerror("Error", f"Player stats file is not writable: {PLAYER_STATS_FILE}\nCheck file permissions.")
-                root.destroy()
-                sys.exit(1)
-        # Verify stats are JSON-serializable
-        json.dumps(stats)  # Raises TypeError if non-serializable
-        with open(PLAYER_STATS_FILE, "w") as file:
-            json.dump(stats, file, indent=2)
-        logging.debug(f"Successfully saved player stats to {PLAYER_STATS_FILE}: {stats}")
-    except (TypeError, json.JSONDecodeError, IOError) as e:
-        logging.error(f"Failed to save player stats to {PLAYER_STATS_FILE}: {str(e)}")
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Error", f"Error writing to player stats file: {PLAYER_STATS_FILE}\n{str(e)}")
-        root.destroy()
-        sys.exit(1)
-
-def load_global_stats():
-    """Load global stats from global_stats.json, create file if it doesn't exist."""
-    logging.debug(f"Attempting to load global_stats from: {GLOBAL_STATS_FILE}")
-    if not os.path.exists(GLOBAL_STATS_FILE):
-        logging.info(f"global_stats.json not found, creating at {GLOBAL_STATS_FILE}")
-        try:
-            default_global_stats = {
-                "total_casts": 0,
-                "total_fish_caught": 0,
-                "rarities": {
-                    "Common": 0,
-                    "Uncommon": 0,
-                    "Rare": 0,
-                    "Very Rare": 0,
-                    "Epic": 0,
-                    "Legendary": 0
-                }
-            }
-            with open(GLOBAL_STATS_FILE, 'w') as file:
-                json.dump(default_global_stats, file, indent=2)
-            logging.debug(f"Created global_stats.json with defaults")
-            return default_global_stats
-        except IOError as e:
-            logging.error(f"Failed to create global_stats.json: {str(e)}")
-            root = tk.Tk()
-            root.withdraw()
-            messagebox.showerror("Error", f"Failed to create global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
-            root.destroy()
-            sys.exit(1)
-    try:
-        with open(GLOBAL_STATS_FILE, "r") as file:
-            stats = json.load(file)
-            default_global_stats = {
-                "total_casts": 0,
-                "total_fish_caught": 0,
-                "rarities": {
-                    "Common": 0,
-                    "Uncommon": 0,
-                    "Rare": 0,
-                    "Very Rare": 0,
-                    "Epic": 0,
-                    "Legendary": 0
-                }
-            }
-            # Ensure all required keys exist
-            for key in default_global_stats:
-                if key not in stats:
-                    stats[key] = default_global_stats[key]
-            for rarity in default_global_stats["rarities"]:
-                if rarity not in stats["rarities"]:
-                    stats["rarities"][rarity] = 0
-            logging.debug(f"Loaded global stats: {stats}")
-            return stats
-    except (json.JSONDecodeError, IOError) as e:
-        logging.error(f"Error reading global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Error", f"Error reading global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
-        root.destroy()
-        sys.exit(1)
-
-def save_global_stats(stats):
-    """Save global stats to global_stats.json."""
-    logging.debug(f"Attempting to save global_stats to: {GLOBAL_STATS_FILE}")
-    try:
-        if os.path.exists(GLOBAL_STATS_FILE):
-            if not os.access(GLOBAL_STATS_FILE, os.W_OK):
-                logging.error(f"Global stats file is not writable: {GLOBAL_STATS_FILE}")
-                root = tk.Tk()
-                root.withdraw()
-                messagebox.showerror("Error", f"Global stats file is not writable: {GLOBAL_STATS_FILE}\nCheck file permissions.")
-                root.destroy()
-                sys.exit(1)
-        json.dumps(stats)  # Verify serializable
-        with open(GLOBAL_STATS_FILE, "w") as file:
-            json.dump(stats, file, indent=2)
-        logging.debug(f"Successfully saved global stats to {GLOBAL_STATS_FILE}: {stats}")
-    except (TypeError, json.JSONDecodeError, IOError) as e:
-        logging.error(f"Failed to save global stats to {GLOBAL_STATS_FILE}: {str(e)}")
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Error", f"Error writing to global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
-        root.destroy()
-        sys.exit(1)
-
-def get_display_username(username):
-    """Get the display username from player_stats.json, or return original."""
-    username_lower = username.lower()
-    stats = load_player_stats()
-    if username_lower in stats and stats[username_lower].get("original_username"):
-        return stats[username_lower]["original_username"]
-    return username
-
-def write_command(command):
-    if not os.path.exists(EXEC_FILE):
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showerror("Error", f"Exec file not found: {EXEC_FILE}\nPlease ensure the file exists in the same directory as the executable.")
-        root.destroy()
-        sys.exit(1)
-    logging.debug(f"Writing command to {EXEC_FILE}: {command}")
-    with open(EXEC_FILE, 'w', encoding='utf-8') as f:
-        f.write(command)
-
-def press_key():
-    time.sleep(0.2)
-    pyautogui.press('f1')
-
-def press_key_no_delay():
-    pyautogui.press('f1')
-
-def commands(username):
-    """Display a list of available commands and their descriptions."""
-    username_lower = username.lower()
-    display_username = get_display_username(username)
-    logging.debug(f"Commands requested by {username}")
-
-    
-    command_list = [
-        "!fish",
-        "!gamble",
-        "!balance",
-        "!stats",
-        "!givemoney",
-        "!shop",
-        "!shop bait",
-        "!shop buy <item_name>"
-    ]
-
-    write_command(f"say [COMMANDS] > {', '.join(command_list)}")
-    press_key()
-    logging.debug(f"Displayed commands for {username}")
\ No newline at end of file
+import time
+import os
+import copy
+import json
+import sys
+import atexit
+import threading
+from dotenv import load_dotenv
+import logging
+import queue
+import sqlite3
+import asyncio
+import contextvars
+import functools
+from contextlib import contextmanager
+from collections import Counter, deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from modules.storage import LedgerBackend, SqliteBackend, MemoryBackend, import_json
+from modules.output import ExecFileBackend, CaptureBackend, StdoutBackend, AppendFileBackend
+from modules.metrics import METRICS, timed
+from modules.leaderboard import Leaderboard
+from modules.identity import IdentityRegistry
+
+# Determine base path for files (bundled or local)
+def get_base_path():
+    override = os.getenv('FISHBOT_BASE_PATH')  # read before .env, which lives in the base path
+    if override:
+        return os.path.abspath(override)
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)  # .exe directory
+    # Use main.py's directory for non-bundled runs, or the working directory when imported from a REPL or -c
+    main_file = getattr(sys.modules.get('__main__'), '__file__', None)
+    if main_file is None:
+        return os.getcwd()
+    return os.path.dirname(os.path.abspath(main_file))
+
+BASE_PATH = get_base_path()
+
+def show_error(message):
+    """Show message in an error dialog, or on stderr when there is no display.
+
+    tkinter is only imported here, so a headless or dialog-free run never
+    loads it. Callers log the error first and exit afterwards.
+    """
+    try:
+        import tkinter as tk
+        from tkinter import messagebox
+        root = tk.Tk()
+    except Exception:  # no tkinter, or tkinter.TclError without a $DISPLAY
+        print(f"Error: {message}", file=sys.stderr)
+        return
+    root.withdraw()
+    messagebox.showerror("Error", message)
+    root.destroy()
+
+# Configure logging
+class SampleFilter(logging.Filter):
+    """Let through the first of every `every` DEBUG records from each call site.
+
+    Hot-path debug lines (every cast, cooldown check and keypress) would
+    otherwise dominate fish.log; sampling keeps one in `every` of them so
+    the log still shows what is going on. INFO and above always pass.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self.seen = Counter()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        count = self.seen[site]
+        self.seen[site] = count + 1
+        return count % self.every == 0
+
+def setup_logging():
+    """Log to a size-rotated fish.log, written by a background thread.
+
+    Records go through a QueueHandler, so the bot never waits on the disk;
+    a QueueListener thread formats and writes them. At exit the listener
+    drains the queue and later records (the final flush and compaction) are
+    written directly.
+    """
+    log_file = os.path.join(BASE_PATH, 'fish.log')
+    try:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+    except OSError as e:
+        show_error(f"Failed to create log file: {log_file}\n{str(e)}")
+        sys.exit(1)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SampleFilter(LOG_SAMPLE_EVERY))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:  # e.g. the stderr handler a logging call made before this one installs
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    level = logging.getLevelName(LOG_LEVEL)
+    root.setLevel(level if isinstance(level, int) else logging.INFO)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+
+    def stop_listener():
+        listener.stop()
+        root.removeHandler(queue_handler)
+        root.addHandler(file_handler)
+    atexit.register(stop_listener)  # runs before the store's close(), which was registered at import
+    if not isinstance(level, int):
+        logging.error("Invalid LOG_LEVEL %r in .env, using INFO", LOG_LEVEL)
+    logging.debug("Logging initialized")
+    logging.debug("BASE_PATH set to: %s", BASE_PATH)
+
+# Load environment variables
+load_dotenv(os.path.join(BASE_PATH, '.env'))
+
+# fish.log: level (DEBUG, INFO, WARNING, ...), rotation size and backups, and DEBUG sampling (1 = log every record)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '3'))
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '100'))
+
+# Default paths if not set in .env
+EXEC_FILE = os.getenv('EXEC_FILE', os.path.join(BASE_PATH, 'exec.txt'))
+CONSOLE_FILE = os.getenv('CONSOLE_FILE', os.path.join(BASE_PATH, 'console.log'))
+# Where chat output goes: exec (cfg file + F1), stdout, append (to OUTPUT_FILE) or capture (memory)
+OUTPUT_BACKEND = os.getenv('OUTPUT_BACKEND', 'exec')
+OUTPUT_FILE = os.getenv('OUTPUT_FILE', os.path.join(BASE_PATH, 'output.log'))
+# Where the console.log read position is checkpointed (empty = always start at the end), and how much backlog to catch up on
+READ_CURSOR_FILE = os.getenv('READ_CURSOR_FILE', os.path.join(BASE_PATH, 'console.cursor'))
+CATCHUP_MAX_AGE = float(os.getenv('CATCHUP_MAX_AGE', '60'))
+CATCHUP_MAX_BYTES = int(os.getenv('CATCHUP_MAX_BYTES', str(1 << 20)))
+# Output coalescing: messages per exec write and how long to wait for more
+OUTPUT_FLUSH_SIZE = int(os.getenv('OUTPUT_FLUSH_SIZE', '4'))
+OUTPUT_FLUSH_LATENCY = float(os.getenv('OUTPUT_FLUSH_LATENCY', '0.05'))
+# Outbound rate limit and backpressure for the output queue
+OUTPUT_RATE = float(os.getenv('OUTPUT_RATE', '3.0'))
+OUTPUT_STALE_AFTER = float(os.getenv('OUTPUT_STALE_AFTER', '1.0'))
+OUTPUT_MAX_DEPTH = int(os.getenv('OUTPUT_MAX_DEPTH', '50'))
+# Metrics: localhost port for a Prometheus scrape endpoint (0 = off) and seconds between summary lines in fish.log (0 = off)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '60'))
+if not EXEC_FILE or not CONSOLE_FILE:
+    logging.warning("EXEC_FILE or CONSOLE_FILE not set in .env, using defaults")
+
+def load_servers():
+    """Return [(console_file, exec_file)]: CONSOLE_FILE/EXEC_FILE, then CONSOLE_FILE_2/EXEC_FILE_2, _3, ... while set."""
+    servers = [(CONSOLE_FILE, EXEC_FILE)]
+    index = 2
+    while os.getenv(f'CONSOLE_FILE_{index}'):
+        exec_file = os.getenv(f'EXEC_FILE_{index}')
+        if not exec_file:
+            logging.error("CONSOLE_FILE_%s is set without EXEC_FILE_%s, ignoring it", index, index)
+        else:
+            servers.append((os.getenv(f'CONSOLE_FILE_{index}'), exec_file))
+        index += 1
+    return servers
+
+def server_path(path, index):
+    """Return the per-server variant of a state file: console.cursor -> console.2.cursor for server 2."""
+    if index == 1 or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+PLAYER_STATS_FILE = os.path.join(BASE_PATH, 'player_stats.json')
+PLAYER_STATS_LEDGER_FILE = os.path.join(BASE_PATH, 'player_stats.ledger')
+GLOBAL_STATS_FILE = os.path.join(BASE_PATH, 'global_stats.json')
+FISHBASE_FILE = os.path.join(BASE_PATH, 'fishbase.json')
+
+# Storage backend: "json" (snapshot + ledger) or "sqlite"
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+STATS_DB_FILE = os.getenv('STATS_DB_FILE', os.path.join(BASE_PATH, 'stats.db'))
+
+# The one player allowed !globalstats and !profile, and exempt from cooldowns
+PRIVILEGED_USERNAME = (os.getenv('PRIVILEGED_USERNAME') or "").lower() or None
+
+def is_privileged(username):
+    return PRIVILEGED_USERNAME is not None and username.lower() == PRIVILEGED_USERNAME
+
+DEFAULT_RARITIES = ["Common", "Uncommon", "Rare", "Very Rare", "Epic", "Legendary"]
+
+# Persistence settings for player_stats.json and its ledger
+PLAYER_STATS_FLUSH_INTERVAL = float(os.getenv('PLAYER_STATS_FLUSH_INTERVAL', '5.0'))
+PLAYER_STATS_FLUSH_EVERY = int(os.getenv('PLAYER_STATS_FLUSH_EVERY', '20'))
+LEDGER_COMPACT_EVERY = int(os.getenv('LEDGER_COMPACT_EVERY', '10000'))
+# Lock the json stats files so several bot processes can share them safely
+STATS_LOCKING = os.getenv('STATS_LOCKING', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def default_player_stats(username=""):
+    """Return a fresh stats record for a new player."""
+    return {
+        "balance": 0.0,
+        "total_casts": 0,
+        "total_fish_caught": 0,
+        "rarities": {rarity: 0 for rarity in DEFAULT_RARITIES},
+        "equipped_rod": "Old Rod",
+        "equipped_bait": "Worm",
+        "original_username": username
+    }
+
+class PlayerStore:
+    """In-memory player stats backed by a snapshot and an append-only ledger.
+
+    Players are loaded once (snapshot + ledger replay). Each commit appends a
+    single ledger record; appends are flushed every flush_interval seconds or
+    flush_every commits, and the ledger is folded into a new snapshot once it
+    holds compact_every records and on exit.
+
+    The global stats aggregate (casts, catches, rarities and the angler
+    count) lives here too: it is loaded once, updated in place, and written
+    with the same flushes instead of on every cast.
+
+    indexes (e.g. leaderboards) are rebuilt when players load and updated
+    by each commit that touches the fields they depend on.
+
+    When the backend is shared with other processes, every write happens
+    under its file lock, after merging in whatever the others wrote since
+    we last looked (see _merge_values). _persisted remembers the values we
+    last read from or wrote to disk, which is the common base for that
+    merge, and the global stats file carries a version counter so a stale
+    aggregate is rebased instead of overwriting newer counts.
+    """
+
+    def __init__(self, backend, flush_interval, flush_every, compact_every, indexes=()):
+        self.backend = backend
+        self.indexes = list(indexes)
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.compact_every = compact_every
+        self._players = None
+        self._persisted = {}
+        self._global = None
+        self._global_base = None
+        self._global_version = 0
+        self._global_dirty = False
+        self._lock_depth = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    @contextmanager
+    def locked(self):
+        """Hold the backend's cross-process lock, with other processes' changes merged in.
+
+        Reentrant. Wrap a read-modify-write in this so the values read are
+        current; commit() takes it around every write anyway.
+        """
+        if not self.backend.shared:
+            yield
+            return
+        with self.backend.lock():
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1 and self._players is not None:
+                    self._sync()
+                yield
+            finally:
+                self._lock_depth -= 1
+
+    def _sync(self):
+        try:
+            patches = self.backend.changes_since()
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error("Error reading changes from other processes: %s\n%s", self.backend.path, e)
+            patches = None
+        if patches is None:  # compacted by another process, or unreadable: reread it all
+            self._merge_players(self._load(), reload=True)
+            return
+        for patch in patches:
+            self._merge_players(patch)
+
+    def _merge_players(self, source, reload=False):
+        """Fold records another process wrote into the live players, keeping our own unsaved changes."""
+        players = self._players
+        created = False
+        for username, fields in source.items():
+            username = username.lower()
+            record = players.get(username)
+            if record is None:
+                record = players[username] = default_player_stats(fields.get("original_username", username))
+                created = True
+            base = self._persisted.setdefault(username, {})
+            defaults = default_player_stats()
+            for field, theirs in fields.items():
+                record[field] = _merge_values(base.get(field, defaults.get(field)), record.get(field), theirs)
+                base[field] = copy.deepcopy(theirs)
+            if not reload:
+                for index in self.indexes:
+                    if index.affected_by(fields):
+                        index.update(username, record)
+        if reload:
+            for index in self.indexes:
+                index.rebuild(players)
+        if created and self._global is not None:
+            self._global["total_anglers"] = len(players)
+
+    def players(self):
+        """Return the live dict of all players, loading it on first use."""
+        if self._players is None:
+            self._players = self._load()
+            if self.backend.shared:
+                self._persisted = copy.deepcopy(self._players)
+            for index in self.indexes:
+                index.rebuild(self._players)
+            self._last_flush = time.monotonic()
+            logging.info("Loaded %s players into memory", len(self._players))
+        return self._players
+
+    def _load(self):
+        logging.debug("Attempting to load player_stats from: %s", self.backend.path)
+        try:
+            with METRICS.time("fishbot_storage_seconds", op="load"):
+                stats = self.backend.load()
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            logging.error("Error reading player stats: %s\n%s", self.backend.path, e)
+            show_error(f"Error reading player stats file: {self.backend.path}\n{str(e)}")
+            sys.exit(1)
+        default_stats = default_player_stats()
+        players = {}
+        for player, data in stats.items():
+            if "original_username" not in data:
+                data["original_username"] = player
+            for key in default_stats:
+                if key not in data:
+                    data[key] = default_stats[key]
+            for rarity in DEFAULT_RARITIES:
+                if rarity not in data["rarities"]:
+                    data["rarities"][rarity] = 0
+            players[player.lower()] = data
+        return players
+
+    def global_stats(self):
+        """Return the live global stats aggregate, loading it on first use."""
+        if self._global is None:
+            self._global = self._load_global()
+        return self._global
+
+    def _load_global(self):
+        logging.debug("Attempting to load global_stats from: %s", self.backend.path)
+        try:
+            with METRICS.time("fishbot_storage_seconds", op="load_global"):
+                stats = self.backend.load_global()
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            logging.error("Error reading global stats: %s", e)
+            show_error(f"Error reading global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
+            sys.exit(1)
+        default_stats = default_global_stats()
+        if stats is None:
+            logging.info("Global stats not found, creating defaults")
+            stats = default_stats
+            self._global_dirty = True
+        # Ensure all required keys exist
+        for key in default_stats:
+            if key not in stats:
+                stats[key] = default_stats[key]
+        for rarity in DEFAULT_RARITIES:
+            if rarity not in stats["rarities"]:
+                stats["rarities"][rarity] = 0
+        self._global_version = stats.pop("version", 0)
+        if self.backend.shared:
+            self._global_base = copy.deepcopy(stats)
+        anglers = len(self.players())
+        if stats["total_anglers"] != anglers:
+            stats["total_anglers"] = anglers
+            self._global_dirty = True
+        logging.debug("Loaded global stats version %s", self._global_version)
+        return stats
+
+    def commit_global(self, stats=None):
+        """Mark the global aggregate changed, replacing its contents with stats if given."""
+        current = self.global_stats()
+        if stats is not None and stats is not current:
+            current.clear()
+            current.update(stats)
+        self._global_dirty = True
+        self._pending += 1
+        self.flush_if_due()
+
+    def _write_global(self):
+        if not self._global_dirty:
+            return
+        try:
+            with self.locked(), METRICS.time("fishbot_storage_seconds", op="save_global"):
+                if self.backend.shared:
+                    self._rebase_global()
+                self._global_version += 1
+                self.backend.save_global(dict(self._global, version=self._global_version))
+                if self.backend.shared:
+                    self._global_base = copy.deepcopy(self._global)
+            logging.debug("Saved global stats version %s", self._global_version)
+        except (TypeError, ValueError, IOError, sqlite3.Error) as e:
+            logging.error("Failed to save global stats: %s", e)
+            show_error(f"Error writing to global stats file: {GLOBAL_STATS_FILE}\n{str(e)}")
+            sys.exit(1)
+        self._global_dirty = False
+
+    def _rebase_global(self):
+        """Merge in global stats another process saved since we loaded or last saved ours."""
+        on_disk = self.backend.load_global()
+        if on_disk is None or on_disk.get("version", 0) == self._global_version:
+            return
+        self._global_version = on_disk.pop("version", 0)
+        merged = copy.deepcopy(_merge_values(self._global_base, self._global, on_disk))  # may be self._global itself
+        self._global.clear()
+        self._global.update(merged)
+        self._global["total_anglers"] = len(self.players())
+        logging.debug("Rebased global stats onto version %s", self._global_version)
+
+    def get(self, username):
+        return self.players().get(username.lower())
+
+    def get_or_create(self, username):
+        """Return a player's live record, creating and committing it if new."""
+        username_lower = username.lower()
+        players = self.players()
+        if username_lower in players:
+            return players[username_lower]
+        with self.locked():  # another process may have just created them
+            if username_lower not in players:
+                global_stats = self.global_stats()  # load before adding, so the new player is counted once
+                players[username_lower] = default_player_stats(username)
+                global_stats["total_anglers"] += 1
+                self._global_dirty = True
+                self.commit("create", {username_lower: None})
+        return players[username_lower]
+
+    def commit(self, op, changes):
+        """Record changes already made to live records as one ledger entry.
+
+        changes maps a username to the list of fields that changed, or None
+        to write the whole record.
+        """
+        with self.locked():
+            players = self.players()
+            patch = {}
+            for username, fields in changes.items():
+                record = players[username.lower()]
+                if fields is None:
+                    patch[username.lower()] = record
+                else:
+                    patch[username.lower()] = {field: record[field] for field in fields}
+                for index in self.indexes:
+                    if index.affected_by(fields):
+                        index.update(username.lower(), record)
+            self._append(op, patch)
+        self._pending += 1
+        self.flush_if_due()
+
+    def _append(self, op, patch):
+        try:
+            with METRICS.time("fishbot_storage_seconds", op="append"):
+                self.backend.append(op, patch)
+            if self.backend.shared:
+                for username, fields in patch.items():
+                    self._persisted.setdefault(username, {}).update(copy.deepcopy(fields))
+        except (TypeError, IOError, sqlite3.Error) as e:
+            logging.error("Failed to record player stats change: %s", e)
+            show_error(f"Error writing to player stats: {self.backend.path}\n{str(e)}")
+            sys.exit(1)
+
+    def flush_if_due(self):
+        if self.backend.records >= self.compact_every:
+            self.compact()
+        elif self._pending and (self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Push buffered changes to disk."""
+        if not self._pending and not self._global_dirty:
+            return
+        logging.debug("Flushing %s player stats changes", self._pending)
+        try:
+            with METRICS.time("fishbot_storage_seconds", op="flush"):
+                self.backend.flush()
+        except (IOError, sqlite3.Error) as e:
+            logging.error("Failed to flush player stats: %s", e)
+            show_error(f"Error writing to player stats: {self.backend.path}\n{str(e)}")
+            sys.exit(1)
+        self._write_global()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def compact(self, force=False):
+        """Write a fresh snapshot of every player and truncate the ledger."""
+        if self._players is None:
+            return
+        logging.debug("Attempting to save player_stats to: %s", self.backend.path)
+        try:
+            with self.locked():
+                if not force and self.backend.records == 0:
+                    return
+                if os.path.exists(self.backend.path) and not os.access(self.backend.path, os.W_OK):
+                    raise IOError("Player stats file is not writable. Check file permissions.")
+                with METRICS.time("fishbot_storage_seconds", op="compact"):
+                    self.backend.compact(self._players)
+        except (TypeError, IOError, sqlite3.Error) as e:
+            logging.error("Failed to save player stats to %s: %s", self.backend.path, e)
+            show_error(f"Error writing to player stats file: {self.backend.path}\n{str(e)}")
+            sys.exit(1)
+        self._write_global()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flush, compact and release the backend; called at exit."""
+        if self._players is not None:
+            self.flush()
+            self.compact()
+        self.backend.close()
+
+    def replace(self, stats):
+        """Replace every player with stats and snapshot immediately."""
+        players = self.players()
+        if stats is not players:
+            players.clear()
+            players.update({player.lower(): data for player, data in stats.items()})
+        for index in self.indexes:
+            index.rebuild(players)
+        if self._global is not None:
+            self._global["total_anglers"] = len(players)
+            self._global_dirty = True
+        if self.backend.shared:
+            self._persisted = copy.deepcopy(players)
+        self.compact(force=True)
+
+def _merge_values(base, ours, theirs):
+    """Three-way merge of one stats value that both we and another process changed from base.
+
+    Whichever side left it alone takes the other's value; counters and
+    balances add both sides' deltas, dicts (rarities) merge key by key, and
+    anything else keeps ours.
+    """
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+        return {key: _merge_values(base.get(key), ours.get(key), theirs.get(key)) for key in {*ours, *theirs}}
+    numbers = (int, float)
+    if all(isinstance(value, numbers) and not isinstance(value, bool) for value in (base, ours, theirs)):
+        return theirs + ours - base
+    return ours
+
+def load_balances():
+    """Return a dict of lowercase username -> balance."""
+    stats = load_player_stats()
+    return {player: data.get("balance", 0.0) for player, data in stats.items()}
+
+def save_balances(username, balance):
+    """Set a single user's balance, creating the player if needed."""
+    username_lower = username.lower()
+    record = PLAYER_STORE.get_or_create(username)
+    record["balance"] = float(balance)  # Ensure balance is float
+    PLAYER_STORE.commit("balance", {username_lower: ["balance"]})
+    logging.info("Saved balance for %s: %s", username_lower, balance)
+
+def get_balance(username):
+    """Get a user's balance, 0.0 if the player is unknown."""
+    username_lower = username.lower()
+    record = PLAYER_STORE.get(username_lower)
+    balance = record.get("balance", 0.0) if record else 0.0
+    logging.debug("Retrieved balance for %s: %s", username_lower, balance)
+    return balance
+
+def update_balance(username, amount):
+    """Update a user's balance and return the new balance."""
+    username_lower = username.lower()
+    with stats_lock():
+        current_balance = get_balance(username_lower)
+        new_balance = current_balance + float(amount)  # Ensure amount is float
+        logging.debug("Updating balance for %s: %s + %s = %s", username_lower, current_balance, amount, new_balance)
+        save_balances(username_lower, new_balance)
+    return new_balance
+
+def stats_lock():
+    """Return a context manager that makes a read-modify-write of player stats atomic across processes.
+
+    Values read inside it are current and nothing another process writes
+    can land between the read and the save; a no-op unless STATS_LOCKING
+    is on and the json backend is in use.
+    """
+    return PLAYER_STORE.locked()
+
+def load_player_stats():
+    """Return the in-memory player stats (lowercase keys).
+
+    The dict is shared with the store; persist edits with save_player_fields,
+    or save_player_stats for a bulk rewrite.
+    """
+    return PLAYER_STORE.players()
+
+def get_or_create_player(username):
+    """Return a player's live stats record, creating it if needed."""
+    return PLAYER_STORE.get_or_create(username)
+
+def save_player_fields(op, changes):
+    """Persist fields already changed on live player records as one ledger record.
+
+    changes maps a username to the list of changed fields, e.g.
+    save_player_fields("purchase", {"bob": ["balance", "equipped_rod"]}).
+    """
+    PLAYER_STORE.commit(op, changes)
+
+def save_player_stats(stats):
+    """Replace all player stats and write a full snapshot of them."""
+    PLAYER_STORE.replace(stats)
+
+def compact_player_stats():
+    """Fold the ledger into player_stats.json and truncate it."""
+    PLAYER_STORE.players()
+    PLAYER_STORE.compact(force=True)
+
+def use_memory_storage():
+    """Switch the player store to an empty in-memory backend that never touches disk."""
+    PLAYER_STORE.backend.close()
+    PLAYER_STORE.backend = MemoryBackend()
+    PLAYER_STORE._players = None
+    PLAYER_STORE._global = None
+    PLAYER_STORE._global_dirty = False
+
+def get_leaderboard(name):
+    """Return the Leaderboard called name, or None."""
+    PLAYER_STORE.players()  # indexes are built on first load
+    return LEADERBOARDS.get(name)
+
+def find_player(name):
+    """Resolve a name typed in chat to (store_key, candidates); see IdentityRegistry.lookup."""
+    PLAYER_STORE.players()  # indexes are built on first load
+    return IDENTITIES.lookup(name)
+
+if STORAGE_BACKEND == "sqlite":
+    _backend = SqliteBackend(STATS_DB_FILE)
+else:
+    _backend = LedgerBackend(PLAYER_STATS_FILE, PLAYER_STATS_LEDGER_FILE, GLOBAL_STATS_FILE, shared=STATS_LOCKING)
+
+# !top boards: name -> score over a player record, kept ordered by the store
+LEADERBOARDS = {
+    "balance": Leaderboard(lambda record: record["balance"], ["balance"]),
+    "fish": Leaderboard(lambda record: record["total_fish_caught"], ["total_fish_caught"]),
+    "legendary": Leaderboard(lambda record: record["rarities"]["Legendary"], ["rarities"]),
+}
+# Normalized name -> store key, for case- and Unicode-insensitive and prefix lookups
+IDENTITIES = IdentityRegistry()
+PLAYER_STORE = PlayerStore(_backend, PLAYER_STATS_FLUSH_INTERVAL, PLAYER_STATS_FLUSH_EVERY, LEDGER_COMPACT_EVERY, [IDENTITIES, *LEADERBOARDS.values()])
+atexit.register(PLAYER_STORE.close)
+
+def default_global_stats():
+    """Return empty global stats."""
+    return {
+        "total_anglers": 0,
+        "total_casts": 0,
+        "total_fish_caught": 0,
+        "rarities": {rarity: 0 for rarity in DEFAULT_RARITIES}
+    }
+
+def load_global_stats():
+    """Return the live global stats aggregate.
+
+    The dict is shared with the store and loaded once; after changing it
+    call save_global_stats so it is written with the next flush.
+    """
+    return PLAYER_STORE.global_stats()
+
+def save_global_stats(stats):
+    """Mark global stats changed (replacing them if stats is a new dict); they are written in batches."""
+    PLAYER_STORE.commit_global(stats)
+
+def import_json_stats():
+    """Copy the JSON player and global stats into STATS_DB_FILE; return the number of players."""
+    return import_json(PLAYER_STATS_FILE, PLAYER_STATS_LEDGER_FILE, GLOBAL_STATS_FILE, STATS_DB_FILE)
+
+def get_display_username(username):
+    """Get the display username from the player store, or return original."""
+    record = PLAYER_STORE.get(username)
+    if record is None:
+        username_key = IDENTITIES.resolve(username)
+        record = PLAYER_STORE.get(username_key) if username_key else None
+    if record and record.get("original_username"):
+        return record["original_username"]
+    return username
+
+def write_command(command, exec_file=None):
+    exec_file = exec_file or EXEC_FILE
+    if not os.path.exists(exec_file):
+        show_error(f"Exec file not found: {exec_file}\nPlease ensure the file exists in the same directory as the executable.")
+        sys.exit(1)
+    logging.debug("Writing command to %s: %s", exec_file, command)
+    with open(exec_file, 'w', encoding='utf-8') as f:
+        f.write(command)
+
+def press_key():
+    with METRICS.time("fishbot_sleep_seconds", reason="keypress"):
+        time.sleep(0.2)
+    press_key_no_delay()
+
+# Every F1 goes to whichever window has focus, so presses from different
+# delivery threads must never interleave
+_keypress_lock = threading.Lock()
+
+def press_key_no_delay():
+    import pyautogui  # imported on the first keypress; it needs a display and is slow to load
+    with _keypress_lock:
+        pyautogui.press('f1')
+
+def uses_keypress(kind=None):
+    """True if the output backend named by kind (default OUTPUT_BACKEND) answers by pressing F1."""
+    return (kind or OUTPUT_BACKEND).lower() not in ("stdout", "append", "capture")
+
+def create_output_backend(kind=None, server=1, exec_file=None):
+    """Build the output backend named by kind (default OUTPUT_BACKEND): exec, stdout, append or capture.
+
+    server and exec_file pick the game client in multi-server mode: its
+    exec file, its own OUTPUT_FILE variant, or a "[2] " prefix on stdout.
+    """
+    kind = (kind or OUTPUT_BACKEND).lower()
+    if kind == "stdout":
+        return StdoutBackend(prefix=f"[{server}] " if server != 1 else "")
+    if kind == "append":
+        return AppendFileBackend(server_path(OUTPUT_FILE, server))
+    if kind == "capture":
+        return CaptureBackend()
+    if kind != "exec":
+        logging.warning("Unknown OUTPUT_BACKEND %r, using exec", kind)
+    if exec_file:
+        return ExecFileBackend(functools.partial(write_command, exec_file=exec_file), press_key)
+    return ExecFileBackend(write_command, press_key)
+
+_output_backend = None
+
+def get_output_backend():
+    global _output_backend
+    if _output_backend is None:
+        _output_backend = create_output_backend()
+    return _output_backend
+
+def set_output_backend(backend):
+    """Deliver all handler output through backend from now on."""
+    global _output_backend
+    if _output_backend is not None and _output_backend is not backend:
+        _output_backend.close()
+    _output_backend = backend
+
+def deliver_messages(commands, backend=None):
+    """Hand a batch of commands to backend, by default the global output backend."""
+    backend = backend or get_output_backend()
+    with METRICS.time("fishbot_output_seconds", backend=type(backend).__name__):
+        backend.deliver(commands)
+
+# Output priorities, most urgent first
+PRIORITY_HIGH = 0    # direct answers such as !balance
+PRIORITY_NORMAL = 1  # command results
+PRIORITY_LOW = 2     # flavour text such as cast announcements; dropped when stale
+
+class OutputQueue:
+    """Rate-limited, prioritized queue that coalesces handler output.
+
+    Messages leave in priority order under a token bucket of rate messages
+    per second (bursting up to flush_size). After the first message arrives
+    the queue waits up to flush_latency seconds for more, then hands at
+    most flush_size messages to the delivery function as one batch, so they
+    share an exec write and keypress. Under backpressure low-priority
+    messages older than stale_after seconds, or beyond max_depth queued
+    messages, are dropped, and a message identical to one already queued is
+    merged into it. Normal and high priority messages are never dropped;
+    producers instead await wait_for_room() before running another command.
+
+    Its depth, the dropped and merged counts and the size of each
+    delivered batch are exported through METRICS, labelled with channel
+    (the server number).
+    """
+
+    def __init__(self, flush_size, flush_latency, rate, stale_after, max_depth, channel=1):
+        self.channel = str(channel)
+        self.flush_size = max(1, flush_size)
+        self.flush_latency = flush_latency
+        self.rate = rate
+        self.stale_after = stale_after
+        self.max_depth = max(1, max_depth)
+        self.pending = [deque() for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self.tokens = float(self.flush_size)
+        self._last_refill = time.monotonic()
+        self._ready = None
+        self._room = None
+        METRICS.gauge("fishbot_output_queue_depth", self.depth, channel=self.channel)
+
+    def put(self, command, priority=PRIORITY_NORMAL):
+        queue = self.pending[priority]
+        if any(queued == command for _, queued in queue):
+            METRICS.inc("fishbot_output_merged_total", channel=self.channel)
+            return
+        queue.append((time.monotonic(), command))
+        if self.depth() > self.max_depth:
+            self._drop_oldest_low_priority()
+        if self._ready is not None:
+            self._ready.set()
+
+    def depth(self, priority=None):
+        """Return the number of queued messages, in total or for one priority."""
+        if priority is not None:
+            return len(self.pending[priority])
+        return sum(len(queue) for queue in self.pending)
+
+    def _drop_oldest_low_priority(self):
+        queue = self.pending[PRIORITY_LOW]
+        if queue:
+            _, command = queue.popleft()
+            METRICS.inc("fishbot_output_dropped_total", channel=self.channel, reason="depth")
+            logging.info("Output queue over %s messages, dropped: %s", self.max_depth, command)
+
+    async def wait_for_room(self):
+        """Wait until fewer than max_depth messages are queued."""
+        while self.depth() >= self.max_depth:
+            if self._room is None:
+                self._room = asyncio.Event()
+            self._room.clear()
+            with METRICS.time("fishbot_sleep_seconds", reason="backpressure"):
+                await self._room.wait()
+
+    def _drop_stale(self):
+        queue = self.pending[PRIORITY_LOW]
+        cutoff = time.monotonic() - self.stale_after
+        while queue and queue[0][0] < cutoff:
+            _, command = queue.popleft()
+            METRICS.inc("fishbot_output_dropped_total", channel=self.channel, reason="stale")
+            logging.debug("Dropped stale message: %s", command)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(float(self.flush_size), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def next_batch(self):
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        waited_for_more = False
+        while True:
+            self._drop_stale()
+            if not self.depth():
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            self._refill()
+            if self.tokens < 1:
+                with METRICS.time("fishbot_sleep_seconds", reason="rate_limit"):
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            if not waited_for_more and self.depth() < self.flush_size and self.flush_latency > 0:
+                waited_for_more = True
+                with METRICS.time("fishbot_sleep_seconds", reason="coalesce"):
+                    await asyncio.sleep(self.flush_latency)
+                continue
+            count = min(self.flush_size, int(self.tokens))
+            batch = []
+            for queue in self.pending:
+                while queue and len(batch) < count:
+                    batch.append(queue.popleft()[1])
+            self.tokens -= len(batch)
+            if self._room is not None:
+                self._room.set()
+            return batch
+
+    async def run(self, deliver):
+        """Deliver batches forever; deliver(commands) runs in a worker thread."""
+        while True:
+            batch = await self.next_batch()
+            try:
+                await asyncio.to_thread(deliver, batch)
+            except Exception as e:
+                METRICS.inc("fishbot_errors_total", source="output")
+                logging.error("Error delivering %s messages: %s", len(batch), e)
+                continue
+            METRICS.observe("fishbot_output_batch_size", len(batch), channel=self.channel)
+            logging.debug("Flushed %s messages with one keypress, %s still queued", len(batch), self.depth())
+
+# A context variable, so each asyncio task (e.g. a command for one server) can answer on its own channel
+_output_sink = contextvars.ContextVar("output_sink", default=None)
+
+def set_output_sink(sink):
+    """Send handler output in the current context to sink(command, priority) instead of delivering it inline; None restores inline delivery."""
+    _output_sink.set(sink)
+
+def send_message(command, priority=PRIORITY_NORMAL):
+    """Send a chat command from a handler."""
+    sink = _output_sink.get()
+    if sink is not None:
+        sink(command, priority)
+    else:
+        deliver_messages([command])
+
+@timed("fishbot_handler_seconds", handler="commands")
+def commands(username):
+    """Display a list of available commands and their descriptions."""
+    username_lower = username.lower()
+    display_username = get_display_username(username)
+    logging.debug("Commands requested by %s", username)
+
+    
+    command_list = [
+        "!fish",
+        "!gamble",
+        "!balance",
+        "!stats",
+        "!givemoney",
+        "!top",
+        "!shop",
+        "!shop bait",
+        "!shop buy <item_name>"
+    ]
+
+    send_message(f"say [COMMANDS] > {', '.join(command_list)}")
+    logging.debug("Displayed commands for %s", username)
\ No newline at end of file